@@ -0,0 +1,971 @@
+"""Micro-benchmarks for the scraper/loader/API hot paths.
+
+    python bench.py fixtures DIR [--channel BBC] [--details 50]
+    python bench.py parsers [DIR] [--repeat 5]
+    python bench.py loader [--records 10000 100000 1000000]
+    python bench.py pipeline [--records 2500] [--repeat 5]
+    python bench.py listing [DIR]
+    python bench.py changes [--records 2500] [--repeat 5]
+    python bench.py swap [--records 100000] [--seconds 10] [--readers 2]
+    python bench.py parse [--records 1000000]
+    python bench.py nowplaying [--channels 500] [--days 7]
+    python bench.py viewers [--channels 10000] [--ticks 20]
+    python bench.py keywords [--keywords 10 1000 5000]
+    python bench.py sse [--clients 1000 5000] [--messages 20]
+    python bench.py webhooks [--messages 20] [--interval 0.2]
+
+``fixtures`` saves a channel listing and some of its detail pages as HTML
+under DIR/listing and DIR/detail; ``parsers`` and ``listing`` read them back,
+from the committed fixtures/ set unless DIR is given, so they run offline.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+SYNTHETIC_CHANNELS = ['BBC Earth', 'Discovery Channel', 'National Geographic']
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+
+# ------------------ fixtures ------------------
+def cmd_fixtures(args):
+    import scraper
+    from check_scrape_output import fixture_name
+
+    out = Path(args.dir)
+    (out / 'listing').mkdir(parents=True, exist_ok=True)
+    (out / 'detail').mkdir(parents=True, exist_ok=True)
+    session = scraper.make_session()
+    channel = scraper.CHANNELS[args.channel]
+    html = session.get(channel.url, timeout=30).content
+    (out / 'listing' / f'{channel.name}.html').write_bytes(html)
+
+    _, days = scraper.parse_listing(html.decode('utf-8', errors='replace'))
+    links = [link for _, rows in days for _, _, link in rows if link]
+    for link in list(dict.fromkeys(links))[:args.details]:
+        scraper.detail_limiter.wait()
+        page = session.get(f'{scraper.SITE_URL}{link}', timeout=10).content
+        (out / 'detail' / fixture_name(link)).write_bytes(page)
+    print(f"Saved 1 listing and {min(args.details, len(set(links)))} detail pages to {out}")
+
+
+# ------------------ parsers ------------------
+def _cpu_per_page(fn, pages, repeat):
+    """Median CPU seconds per page over ``repeat`` passes."""
+    per_pass = []
+    for _ in range(repeat):
+        t0 = time.process_time()
+        for html in pages:
+            fn(html)
+        per_pass.append((time.process_time() - t0) / len(pages))
+    return statistics.median(per_pass)
+
+
+def cmd_parsers(args):
+    import page_parser
+    from bs4 import BeautifulSoup
+
+    root = Path(args.dir)
+    kinds = {
+        'listing': [p.read_bytes().decode('utf-8', errors='replace')
+                    for p in sorted((root / 'listing').glob('*.html'))],
+        'detail': [p.read_bytes().decode('utf-8', errors='replace')
+                   for p in sorted((root / 'detail').glob('*.html'))],
+    }
+
+    # Reference: what the scraper did before, a full html.parser tree
+    def full_listing(html):
+        soup = BeautifulSoup(html, 'html.parser')
+        return [b.select('.programme-list__item') for b in soup.select('.programme-list')]
+
+    def full_detail(html):
+        soup = BeautifulSoup(html, 'html.parser')
+        return [soup.select_one(s) for s in ('.post__body p', '.bg-warning .h3', '.tagy')]
+
+    variants = [('html.parser (full tree)', full_listing, full_detail)]
+    for backend in page_parser.available_backends():
+        variants.append((
+            backend,
+            lambda html, b=backend: page_parser.parse_listing(html, b),
+            lambda html, b=backend: page_parser.parse_details(html, b),
+        ))
+
+    print(f"{'backend':<26}{'listing ms/page':>18}{'detail ms/page':>18}")
+    for name, listing_fn, detail_fn in variants:
+        cols = []
+        for kind, fn in (('listing', listing_fn), ('detail', detail_fn)):
+            pages = kinds[kind]
+            cols.append(f"{_cpu_per_page(fn, pages, args.repeat) * 1000:.2f}" if pages else '-')
+        print(f"{name:<26}{cols[0]:>18}{cols[1]:>18}")
+
+    # Every backend must extract the same fields
+    reference = page_parser.available_backends()[-1]
+    for backend in page_parser.available_backends()[:-1]:
+        bad = sum(page_parser.parse_details(h, backend) != page_parser.parse_details(h, reference)
+                  for h in kinds['detail'])
+        bad += sum(page_parser.parse_listing(h, backend) != page_parser.parse_listing(h, reference)
+                   for h in kinds['listing'])
+        if bad:
+            print(f"WARNING: {backend} disagrees with {reference} on {bad} page(s)")
+
+
+# ------------------ synthetic data ------------------
+def synthetic_programs(n_records, channels=SYNTHETIC_CHANNELS, n_titles=2000, seed=1):
+    """n_records program dicts shaped like scraper.build_programs() output.
+
+    Slots are 30 minutes apart per channel, so (channel, date, start) is
+    unique; titles repeat across the week like the real lineup does.
+    """
+    import scraper
+
+    rnd = random.Random(seed)
+    start_day = date(2025, 1, 6)
+    days = list(scraper.day_map)
+    for i in range(n_records):
+        channel = channels[i % len(channels)]
+        slot = i // len(channels)
+        day = start_day + timedelta(days=slot // 48)
+        minute = (slot % 48) * 30
+        t = rnd.randrange(n_titles)
+        yield {
+            'Title': f'Program {t}',
+            'Day': days[day.weekday()],
+            'Date': day.strftime('%d.%m.%Y'),
+            'Start Time': f'{minute // 60:02d}:{minute % 60:02d}',
+            'End Time': f'{(minute + 30) // 60 % 24:02d}:{(minute + 30) % 60:02d}',
+            'Duration': '30 min',
+            'Channel': channel,
+            'Link': f'/program/program-{t}/',
+            'Original Name': f'Original {t}',
+            'Year': str(1990 + t % 35),
+            'Description': f'Synthetic description of program {t}.',
+            'Score': f'{t % 100}%',
+            'Genre': 'Dokument',
+        }
+
+
+def write_synthetic_programs(path, n_records, channels=SYNTHETIC_CHANNELS,
+                             n_titles=2000, seed=1):
+    """Write synthetic_programs() in the scraper's tv_programs_*.txt format."""
+    import scraper
+
+    scraper.write_programs(synthetic_programs(n_records, channels, n_titles, seed), path)
+
+
+# ------------------ loader ------------------
+def cmd_loader(args):
+    import load_tv_programs_sqlite as loader
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'records':>10}{'per-record rows/s':>20}{'bulk rows/s':>16}{'speedup':>10}")
+        for n in args.records:
+            src = Path(tmp) / f'tv_programs_{n}.txt'
+            write_synthetic_programs(src, n)
+            rows = loader.parse_file(src)
+
+            rates = []
+            for load in (loader.load_rows_per_record, loader.load_rows):
+                db = Path(tmp) / f'{load.__name__}_{n}.db'
+                conn = sqlite3.connect(db)
+                loader.init_db(conn)
+                t0 = time.perf_counter()
+                load(conn, rows)
+                rates.append(len(rows) / (time.perf_counter() - t0))
+                conn.close()
+                os.remove(db)
+            print(f"{n:>10}{rates[0]:>20,.0f}{rates[1]:>16,.0f}{rates[1] / rates[0]:>9.1f}x")
+
+
+# ------------------ scrape -> DB pipeline ------------------
+def _pipeline_subprocess(outputs, db, cwd):
+    """scheduler's subprocess mode minus the network: a scraper interpreter
+    that writes the txt file, then a loader process that re-parses it."""
+    import scraper
+
+    # full loads on both sides: this compares the transport, not change detection
+    env = {**os.environ, 'DB_PATH': str(db), 'SCHEDULE_EXPORT': '0', 'LOAD_INCREMENTAL': '0'}
+    loader_py = Path(__file__).resolve().parent / 'load_tv_programs_sqlite.py'
+    for output, programs in outputs.items():
+        subprocess.run([sys.executable, '-c', 'import scraper'], check=True, env=env,
+                       cwd=loader_py.parent)
+        scraper.write_programs(programs, Path(cwd) / output)
+        subprocess.run([sys.executable, str(loader_py), output], check=True, env=env, cwd=cwd,
+                       stdout=subprocess.DEVNULL)
+
+
+def _pipeline_inprocess(outputs, conn, cwd, write_txt=False):
+    import load_tv_programs_sqlite as loader
+    import scraper
+
+    for output, programs in outputs.items():
+        if write_txt:
+            scraper.write_programs(programs, Path(cwd) / output)
+        loader.load_rows(conn, list(scraper.program_records(programs, output)))
+
+
+def cmd_pipeline(args):
+    import load_tv_programs_sqlite as loader
+
+    outputs = {}
+    for i, name in enumerate(SYNTHETIC_CHANNELS):
+        outputs[f'tv_programs_{i}.txt'] = list(
+            synthetic_programs(args.records, channels=[name], seed=i + 1))
+
+    variants = {
+        'subprocess + txt': lambda conn, db, cwd: _pipeline_subprocess(outputs, db, cwd),
+        'in-process + txt': lambda conn, db, cwd: _pipeline_inprocess(outputs, conn, cwd, True),
+        'in-process': lambda conn, db, cwd: _pipeline_inprocess(outputs, conn, cwd),
+    }
+    print(f"{len(outputs)} channels x {args.records} records, median of {args.repeat} cycles")
+    print(f"{'pipeline':<20}{'ms/cycle':>10}{'speedup':>9}")
+    baseline = None
+    contents = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, run in variants.items():
+            db = Path(tmp) / f'{len(contents)}.db'
+            conn = sqlite3.connect(db)
+            loader.init_db(conn)
+            times = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                run(conn, db, tmp)
+                times.append(time.perf_counter() - t0)
+            contents.append(sorted(conn.execute(
+                "SELECT pi.title, pi.channel, pi.original_name, pi.prod_year, pi.description,"
+                " pi.score_pct, pi.duration_min, pi.link, pi.genre, pi.source_file,"
+                " ps.day_name, ps.air_date, ps.start_time, ps.end_time"
+                " FROM program_schedule ps JOIN program_info pi ON pi.id = ps.program_id")))
+            conn.close()
+            ms = statistics.median(times) * 1000
+            baseline = baseline or ms
+            print(f"{label:<20}{ms:>10.1f}{baseline / ms:>8.1f}x")
+    if any(c != contents[0] for c in contents):
+        print("WARNING: pipelines loaded different rows")
+
+
+# ------------------ conditional listing fetch ------------------
+def _stub_site(listing, details):
+    """Local stand-in for the TV site: ``details`` ({link: page}) at their links
+    and ``listing`` at any other path, with an ETag and a 304 on a matching
+    If-None-Match while state['etag'] is on."""
+    import hashlib
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {'listing': listing, 'etag': True, 'requests': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with lock:
+                state['requests'] += 1
+            body, tag = details.get(self.path), None
+            if body is None:
+                body = state['listing']
+                if state['etag']:
+                    tag = f'"{hashlib.md5(body).hexdigest()}"'
+                if tag and self.headers.get('If-None-Match') == tag:
+                    self.send_response(304)
+                    self.send_header('ETag', tag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+            self.send_response(200)
+            if tag:
+                self.send_header('ETag', tag)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def cmd_listing(args):
+    import scraper
+    from check_scrape_output import fixture_name
+    from detail_cache import DetailCache
+
+    root = Path(args.dir)
+    listing = sorted((root / 'listing').glob('*.html'))[0].read_bytes()
+    _, days = scraper.parse_listing(listing.decode('utf-8', errors='replace'))
+    pages = {fixture_name(link): link for _, rows in days for _, _, link in rows if link}
+    details = {pages[p.name]: p.read_bytes() for p in (root / 'detail').glob('*.html')
+               if p.name in pages}
+    server, state = _stub_site(listing, details)
+    site = f'http://127.0.0.1:{server.server_address[1]}'
+    scraper.SITE_URL = site
+    scraper.detail_limiter = scraper.RateLimiter(0)  # local stub, no politeness needed
+    base_date = datetime(2025, 11, 6)
+
+    steps = [
+        ('cold cache', lambda: None),
+        ('not modified (304)', lambda: None),
+        ('no ETag, same body', lambda: state.update(etag=False)),
+        ('new base date', lambda: None),
+        ('changed listing', lambda: state.update(listing=listing + b'<!-- changed -->')),
+    ]
+    print(f"{'step':<22}{'result':>14}{'requests':>10}{'ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        channel = scraper.Channel('stub', f'{site}/listing/', str(Path(tmp) / 'tv_programs_stub.txt'))
+        store = DetailCache(str(Path(tmp) / 'cache.db'))
+        session = scraper.make_session()
+        for label, prepare in steps:
+            prepare()
+            if label == 'new base date':
+                base_date += timedelta(days=1)
+            state['requests'] = 0
+            t0 = time.perf_counter()
+            programs, validators = scraper.scrape_channel(channel, {}, base_date, store, session)
+            if validators:
+                store.put_listing(**validators)
+            elapsed = (time.perf_counter() - t0) * 1000
+            result = 'unchanged' if programs is None else f'{len(programs)} programs'
+            print(f"{label:<22}{result:>14}{state['requests']:>10}{elapsed:>9.1f}")
+        session.close()
+        store.close()
+    server.shutdown()
+
+
+# ------------------ change detection ------------------
+def cmd_changes(args):
+    import load_tv_programs_sqlite as loader
+    import scraper
+
+    rows = []
+    for i, name in enumerate(SYNTHETIC_CHANNELS):
+        programs = synthetic_programs(args.records, channels=[name], seed=i + 1)
+        rows.extend(scraper.program_records(programs, f'tv_programs_{i}.txt'))
+    first_day = min(row.air_date for row in rows)
+
+    def edit(kind):
+        if kind == 'unchanged':
+            return rows
+        if kind == 'one day changed':
+            return [row._replace(end_time='23:59:00') if row.air_date == first_day else row
+                    for row in rows]
+        return [row._replace(end_time='23:59:00') for row in rows]
+
+    n_days = len({(row.channel, row.air_date) for row in rows})
+    print(f"{len(rows)} records, {n_days} channel-days, median of {args.repeat} loads")
+    print(f"{'listing':<18}{'full ms':>9}{'writes':>8}{'diff ms':>9}{'writes':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in ('unchanged', 'one day changed', 'all days changed'):
+            line = f"{kind:<18}"
+            for load in (loader.load_rows, loader.load_rows_incremental):
+                times, writes = [], 0
+                for r in range(args.repeat):
+                    db = Path(tmp) / f'{load.__name__}_{r}.db'
+                    conn = sqlite3.connect(db)
+                    loader.init_db(conn)
+                    load(conn, rows)  # the previous cycle's listing
+                    before = conn.total_changes
+                    t0 = time.perf_counter()
+                    load(conn, edit(kind))
+                    times.append(time.perf_counter() - t0)
+                    writes = conn.total_changes - before
+                    conn.close()
+                    os.remove(db)
+                line += f"{statistics.median(times) * 1000:>9.1f}{writes:>8}"
+            print(line)
+
+
+# ------------------ reader latency during loads ------------------
+def _swap_reader(db, air_date, at_time, seconds, ready, queue):
+    """API-style reads (connect read-only, current-or-next, close) for ``seconds``."""
+    import flask_now_playing as api
+
+    latencies = []
+    ready.wait()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        t0 = time.perf_counter()
+        conn = sqlite3.connect(f'file:{db}?mode=ro', uri=True)
+        api.current_or_next(conn, air_date, at_time)
+        conn.close()
+        latencies.append(time.perf_counter() - t0)
+    queue.put(latencies)
+
+
+def _swap_index_reader(db, air_date, at_time, seconds, ready, done, queue):
+    """The API's ScheduleIndex on db, checking for a new version on every lookup
+    for ``seconds``; once the writer is ``done``, one more lookup must be served
+    from the file db now points at. Reports (lookups, errors, files read)."""
+    import flask_now_playing as api
+
+    api.INDEX_CHECK_SEC = 0
+    index = api.ScheduleIndex(db)
+    expected = len(index.current(air_date, at_time) or [])
+    lookups, errors, files = 0, [], set()
+
+    def lookup():
+        try:
+            programs = index.current(air_date, at_time)
+            if not expected or programs is None or len(programs) != expected:
+                errors.append(f"{len(programs or [])} programs on air, expected {expected}")
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        files.add(index._conn_ino)
+
+    ready.wait()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        lookup()
+        lookups += 1
+    done.wait()
+    lookup()
+    if index._conn_ino != os.stat(db).st_ino:
+        errors.append("index still reads a replaced file after the last load")
+    queue.put((lookups, errors[:5] + ([f"... {len(errors) - 5} more"] if len(errors) > 5 else []),
+               len(files)))
+
+
+def cmd_swap(args):
+    import load_tv_programs_sqlite as loader
+
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{args.readers} reader processes + 1 ScheduleIndex reader, "
+          f"{args.records}-record load + retention per cycle, {args.seconds}s per scenario")
+    print(f"{'scenario':<10}{'loads':>7}{'load ms':>9}{'copy ms':>9}{'copy MiB':>10}{'reads':>9}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'index reads':>13}{'files':>7}")
+    # time the copy each snapshot write starts from (writable_db -> begin_snapshot)
+    copies = []
+    begin_snapshot = loader.begin_snapshot
+
+    def timed_begin_snapshot(db_path, staging):
+        t0 = time.perf_counter()
+        conn = begin_snapshot(db_path, staging)
+        copies.append((time.perf_counter() - t0, os.path.getsize(staging)))
+        return conn
+
+    loader.begin_snapshot = timed_begin_snapshot
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'tv_programs_synthetic.txt'
+        write_synthetic_programs(src, args.records)
+        rows = loader.parse_file(src)
+        for scenario in ('idle', 'inplace', 'snapshot'):
+            publish = 'snapshot' if scenario == 'snapshot' else 'inplace'
+            folder = Path(tmp) / scenario
+            folder.mkdir()
+            db = str(folder / 'tvguide.db')
+            with loader.writable_db(db, publish) as conn:
+                loader.load_rows(conn, rows)
+
+            ready, done, queue, index_queue = ctx.Event(), ctx.Event(), ctx.Queue(), ctx.Queue()
+            readers = [ctx.Process(target=_swap_reader,
+                                   args=(db, '2025-01-06', '12:00:00', args.seconds, ready, queue))
+                       for _ in range(args.readers)]
+            index_reader = ctx.Process(target=_swap_index_reader,
+                                       args=(db, '2025-01-06', '12:00:00', args.seconds,
+                                             ready, done, index_queue))
+            for proc in readers + [index_reader]:
+                proc.start()
+            time.sleep(1)  # let the readers import before the clock starts
+            ready.set()
+            loads, load_sec = 0, []
+            copies.clear()
+            end = time.monotonic() + args.seconds
+            if scenario == 'idle':
+                time.sleep(args.seconds)
+            while scenario != 'idle' and time.monotonic() < end:
+                t0 = time.perf_counter()
+                with loader.writable_db(db, publish) as conn:
+                    loader.load_rows(conn, rows)
+                    loader.apply_retention(conn, horizon_days=100000)
+                load_sec.append(time.perf_counter() - t0)
+                loads += 1
+            done.set()
+            latencies = [lat * 1000 for _ in readers for lat in queue.get()]
+            index_reads, errors, files = index_queue.get()
+            for proc in readers + [index_reader]:
+                proc.join()
+            p99 = statistics.quantiles(latencies, n=100)[98]
+            load_ms = f"{statistics.fmean(load_sec) * 1000:>9.0f}" if load_sec else f"{'-':>9}"
+            if copies:
+                copy = (f"{statistics.fmean(sec for sec, _ in copies) * 1000:>9.0f}"
+                        f"{statistics.fmean(size for _, size in copies) / 2**20:>10.1f}")
+            else:
+                copy = f"{'-':>9}{'-':>10}"
+            print(f"{scenario:<10}{loads:>7}{load_ms}{copy}{len(latencies):>9}"
+                  f"{statistics.median(latencies):>9.2f}{p99:>9.2f}{max(latencies):>9.1f}"
+                  f"{index_reads:>13}{files:>7}")
+            # every published snapshot is a new file the index has to reopen
+            if scenario == 'snapshot' and loads and files < 2:
+                errors.append("index never reopened the database after a publish")
+            failures.extend(f"{scenario}: {e}" for e in errors)
+    loader.begin_snapshot = begin_snapshot
+
+    if failures:
+        print("\nFAIL: ScheduleIndex did not survive the swaps\n  " + "\n  ".join(failures))
+        return 1
+    print("\nOK: ScheduleIndex kept answering and followed every swap")
+    return 0
+
+
+# ------------------ tv_programs parser ------------------
+PARSE_VARIANTS = {
+    'regex, list': lambda path: len(__import__('tv_format').parse_file_regex(path)),
+    'mmap stream, list': lambda path: len(list(__import__('tv_format').iter_programs(path))),
+    'mmap stream, consumed': lambda path: sum(1 for _ in __import__('tv_format').iter_programs(path)),
+}
+
+
+def _parse_worker(variant, path, queue):
+    """Runs in a fresh interpreter so ru_maxrss is this variant's own peak."""
+    import resource
+
+    t0 = time.perf_counter()
+    n = PARSE_VARIANTS[variant](path)
+    elapsed = time.perf_counter() - t0
+    queue.put((n, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def cmd_parse(args):
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'tv_programs_synthetic.txt'
+        write_synthetic_programs(src, args.records)
+        size_mb = src.stat().st_size / 2**20
+        print(f"{args.records} records, {size_mb:.0f} MiB")
+        print(f"{'parser':<24}{'records/s':>12}{'MiB/s':>9}{'peak RSS MiB':>14}")
+        for variant in PARSE_VARIANTS:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_parse_worker, args=(variant, str(src), queue))
+            proc.start()
+            n, elapsed, maxrss_kb = queue.get()
+            proc.join()
+            print(f"{variant:<24}{n / elapsed:>12,.0f}{size_mb / elapsed:>9.1f}{maxrss_kb / 1024:>14.0f}")
+
+
+# ------------------ now playing ------------------
+def cmd_nowplaying(args):
+    import flask_now_playing as api
+    import load_tv_programs_sqlite as loader
+
+    channels = [f'Channel {i:03d}' for i in range(args.channels)]
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'tv_programs_synthetic.txt'
+        write_synthetic_programs(src, args.channels * 48 * args.days, channels=channels)
+        conn = sqlite3.connect(Path(tmp) / 'nowplaying.db')
+        loader.init_db(conn)
+        loader.load_rows(conn, loader.parse_file(src))
+
+        air_date = '2025-01-07'  # a full day in the middle of the synthetic week
+        times = [f'{h:02d}:{m:02d}:00' for h in range(24) for m in (0, 10, 29)]
+        print(f"{args.channels} channels, {args.days} days, {len(times)} lookups per variant")
+        rates = []
+        for fn in (api.current_or_next_per_channel, api.current_or_next):
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                for t in times:
+                    fn(conn, air_date, t)
+            ms = (time.perf_counter() - t0) / (args.repeat * len(times)) * 1000
+            rates.append(ms)
+            print(f"{fn.__name__:<30}{ms:>10.2f} ms/lookup")
+        print(f"{'speedup':<30}{rates[0] / rates[1]:>10.1f}x")
+
+        bad = sum(sorted(api.current_or_next(conn, air_date, t)) !=
+                  sorted(api.current_or_next_per_channel(conn, air_date, t)) for t in times)
+        if bad:
+            print(f"WARNING: results differ at {bad} of {len(times)} times")
+        conn.close()
+
+
+# ------------------ viewer simulation ------------------
+def _describe(values):
+    values = sorted(values)
+    q = lambda p: values[int(p * (len(values) - 1))]
+    return (statistics.fmean(values), statistics.pstdev(values), q(0.05), q(0.5), q(0.95))
+
+
+def cmd_viewers(args):
+    import flask_now_playing as api
+    from viewer_engine import ViewerEngine
+
+    channels = [f'Channel {i:05d}' for i in range(args.channels)]
+    keywords = ['', ' premiere', ' rerun', ' live', ' recap', ' shark week']
+    titles = {ch: f'Program {i % 997}{keywords[i % len(keywords)]}' for i, ch in enumerate(channels)}
+    start = datetime(2025, 1, 7, 19, 55)  # crosses into the 20-22 prime band
+    ticks = [start + timedelta(seconds=api.CONFIG["VIEWERS_INTERVAL_SEC"] * k)
+             for k in range(args.ticks)]
+
+    def run(tick_fn):
+        per_tick, history = [], []
+        for now in ticks:
+            t0 = time.perf_counter()
+            out = tick_fn(now)
+            per_tick.append(time.perf_counter() - t0)
+            history.append([int(v['viewers']) for v in out])
+        return statistics.median(per_tick), history
+
+    random.seed(args.seed)
+    api._viewer_state.clear()
+    api._viewer_state_ts.clear()
+    scalar_sec, scalar = run(lambda now: api.generate_viewers_snapshot(now, titles, channels))
+
+    engine = ViewerEngine(channels, api.CONFIG, api.HOUR_BANDS_V2, api._popularity_factor,
+                          seed=args.seed)
+    engine.set_titles(titles)
+    vector_sec, vector = run(engine.snapshot)
+
+    print(f"{args.channels} channels, {args.ticks} ticks")
+    print(f"{'engine':<12}{'ms/tick':>10}")
+    print(f"{'scalar':<12}{scalar_sec * 1000:>10.2f}")
+    print(f"{'numpy':<12}{vector_sec * 1000:>10.2f}   ({scalar_sec / vector_sec:.1f}x)")
+
+    # Same model, different random streams: the distributions must agree
+    print(f"\n{'distribution':<28}{'mean':>9}{'std':>9}{'p5':>8}{'p50':>8}{'p95':>8}")
+    stats = {}
+    for label, history in (('scalar', scalar), ('numpy', vector)):
+        deltas = [b - a for prev, cur in zip(history, history[1:]) for a, b in zip(prev, cur)]
+        for kind, values in (('viewers (last tick)', history[-1]), ('per-tick delta', deltas)):
+            stats[label, kind] = _describe(values)
+            print(f"{label + ' ' + kind:<28}" + ''.join(f"{v:>9.1f}" if i < 2 else f"{v:>8.0f}"
+                                                      for i, v in enumerate(stats[label, kind])))
+
+    # each statistic within a fraction of the larger spread (wider for few channels)
+    tolerance = max(0.25, 20 / args.channels ** 0.5)
+    mismatches = []
+    for kind in ('viewers (last tick)', 'per-tick delta'):
+        ref, got = stats['scalar', kind], stats['numpy', kind]
+        limit = tolerance * max(ref[1], got[1], 1.0)
+        for name, a, b in zip(('mean', 'std', 'p5', 'p50', 'p95'), ref, got):
+            if abs(a - b) > limit:
+                mismatches.append(f"{kind} {name}: scalar {a:.1f} vs numpy {b:.1f} (limit ±{limit:.1f})")
+    if mismatches:
+        print("\nFAIL: numpy distribution differs from scalar\n  " + "\n  ".join(mismatches))
+        return 1
+    print(f"\nOK: distributions agree (each statistic within {tolerance:.2f} std)")
+    return 0
+
+
+# ------------------ keyword matching ------------------
+def _scan_popularity(title, popular, unpopular):
+    """The original per-keyword substring loop, as the reference."""
+    if not title:
+        return 1.0
+    t = title.lower()
+    best = 1.0
+    for k, m in popular.items():
+        if k in t:
+            best = max(best, m)
+    for k, m in unpopular.items():
+        if k in t:
+            best = min(best, m)
+    return best
+
+
+def cmd_keywords(args):
+    from keyword_matcher import PopularityMatcher
+
+    rnd = random.Random(args.seed)
+    vocab = [''.join(rnd.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rnd.randint(3, 9)))
+             for _ in range(3000)]
+    titles = [' '.join(rnd.choice(vocab) for _ in range(rnd.randint(2, 6))).title()
+              for _ in range(args.titles)]
+
+    print(f"{args.titles} titles")
+    print(f"{'keywords':>9}{'scan us/title':>15}{'matcher us/title':>18}{'memoised us/title':>19}")
+    for n in args.keywords:
+        phrases = [' '.join(rnd.sample(vocab, rnd.randint(1, 2))) for _ in range(n)]
+        popular = {p: round(rnd.uniform(1.05, 1.4), 2) for p in phrases[::2]}
+        unpopular = {p: round(rnd.uniform(0.8, 0.95), 2) for p in phrases[1::2]}
+        matcher = PopularityMatcher(popular, unpopular)
+
+        timings = []
+        for fn in (lambda t: _scan_popularity(t, popular, unpopular), matcher._factor, matcher.factor):
+            t0 = time.perf_counter()
+            for t in titles:
+                fn(t)
+            timings.append((time.perf_counter() - t0) / len(titles) * 1e6)
+        # a second pass is what the per-tick path sees: titles repeat until the next program
+        t0 = time.perf_counter()
+        for t in titles:
+            matcher.factor(t)
+        timings[2] = (time.perf_counter() - t0) / len(titles) * 1e6
+        print(f"{n:>9}{timings[0]:>15.2f}{timings[1]:>18.2f}{timings[2]:>19.2f}")
+
+        bad = sum(_scan_popularity(t, popular, unpopular) != matcher.factor(t) for t in titles)
+        if bad:
+            print(f"WARNING: matcher disagrees with the scan on {bad} title(s)")
+
+
+# ------------ SSE fan-out ------------
+def _proc_usage(pid):
+    """(RSS bytes, user+system CPU seconds) of pid, from /proc (Linux only)."""
+    with open(f'/proc/{pid}/status') as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:'))
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return rss, (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def _sse_hub_process(conn):
+    """Child: run an SSEHub on an ephemeral port and obey commands from conn."""
+    from sse_hub import SSEHub
+
+    hub = SSEHub(host='127.0.0.1', port=0)
+    conn.send(hub.start())
+    while True:
+        cmd, arg = conn.recv()
+        if cmd == 'publish':
+            hub.publish(arg)
+        elif cmd == 'stats':
+            conn.send((hub.subscriber_count(), dict(hub.stats)))
+        else:
+            return
+
+
+class _SSEClient(asyncio.Protocol):
+    def __init__(self, counter, slow):
+        self.counter = counter
+        self.slow = slow
+
+    def connection_made(self, transport):
+        transport.write(b'GET /subscribe HTTP/1.1\r\nHost: bench\r\n\r\n')
+        if self.slow:  # never reads: the hub must coalesce, then drop it
+            transport.pause_reading()
+
+    def data_received(self, data):
+        self.counter[0] += data.count(b'data: ')
+
+
+async def _sse_run(port, conn, pid, n_clients, n_slow, n_messages, payload):
+    loop = asyncio.get_running_loop()
+    counter = [0]
+    base_rss, _ = _proc_usage(pid)
+    sem = asyncio.Semaphore(256)
+
+    async def connect(slow):
+        async with sem:
+            return await loop.create_connection(lambda: _SSEClient(counter, slow), '127.0.0.1', port)
+
+    conns = await asyncio.gather(*(connect(i < n_slow) for i in range(n_clients)))
+    while True:
+        conn.send(('stats', None))
+        if conn.recv()[0] >= n_clients:
+            break
+        await asyncio.sleep(0.05)
+    rss, cpu0 = _proc_usage(pid)
+
+    await asyncio.sleep(2)  # idle subscribers should cost nothing
+    _, cpu1 = _proc_usage(pid)
+
+    expected = (n_clients - n_slow) * n_messages
+    for i in range(n_messages):
+        conn.send(('publish', payload))
+        await asyncio.sleep(0.05)
+    deadline = loop.time() + 30
+    while counter[0] < expected and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+    _, cpu2 = _proc_usage(pid)
+    conn.send(('stats', None))
+    _, stats = conn.recv()
+    for transport, _ in conns:
+        transport.close()
+    return {
+        'rss_per_1k': (rss - base_rss) / n_clients * 1000,
+        'idle_cpu_pct': (cpu1 - cpu0) / 2 * 100,
+        'cpu_ms_per_msg_1k': (cpu2 - cpu1) / n_messages / n_clients * 1e6,
+        'received': counter[0], 'expected': expected, **stats,
+    }
+
+
+def cmd_sse(args):
+    import resource
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    need = 2 * max(args.clients) + 64  # both ends of every connection
+    if soft < need:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(need, hard), hard))
+
+    viewers = [{"channel": f"Channel {i}", "viewers": str(3000 + i)} for i in range(args.channels)]
+    payload = json.dumps(viewers, ensure_ascii=False)
+    print(f"payload {len(payload)} bytes, {args.messages} messages, {args.slow} slow client(s)")
+    print(f"{'clients':>8}{'RSS KiB/1k':>12}{'idle CPU %':>12}{'CPU ms/msg/1k':>15}"
+          f"{'received':>12}{'coalesced':>11}{'dropped':>9}")
+    for n in args.clients:
+        parent, child = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=_sse_hub_process, args=(child,), daemon=True)
+        proc.start()
+        port = parent.recv()
+        r = asyncio.run(_sse_run(port, parent, proc.pid, n, min(args.slow, n),
+                                 args.messages, payload))
+        parent.send(('stop', None))
+        proc.join(5)
+        print(f"{n:>8}{r['rss_per_1k'] / 1024:>12,.0f}{r['idle_cpu_pct']:>12.2f}"
+              f"{r['cpu_ms_per_msg_1k']:>15.2f}{r['received']:>7}/{r['expected']:<5}"
+              f"{r['coalesced']:>10}{r['dropped']:>9}")
+
+
+# ------------ webhooks ------------
+def _stub_receiver(behaviour):
+    """Local HTTP/1.1 receiver: fast, slow (2 s), flaky (every 2nd is 503) or hang (10 s)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {'requests': 0, 'connections': set()}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with lock:
+                state['requests'] += 1
+                state['connections'].add(self.client_address)
+                n = state['requests']
+            if behaviour == 'slow':
+                time.sleep(2)
+            elif behaviour == 'hang':
+                time.sleep(10)
+            status = 503 if behaviour == 'flaky' and n % 2 else 204
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def cmd_webhooks(args):
+    from webhook_dispatcher import WebhookDispatcher
+
+    receivers = {}
+    dispatcher = WebhookDispatcher(workers=args.workers, timeout=args.timeout, backoff_sec=0.2)
+    for behaviour in ('fast', 'fast', 'slow', 'flaky', 'hang'):
+        server, state = _stub_receiver(behaviour)
+        url = f'http://127.0.0.1:{server.server_address[1]}/hook/{behaviour}'
+        receivers[url] = (behaviour, server, state)
+        dispatcher.add(url)
+    dispatcher.add('http://127.0.0.1:9/hook/down')  # nothing listens on the discard port
+    dispatcher.start()
+
+    payload = json.dumps([{"channel": f"Channel {i}", "viewers": str(3000 + i)}
+                          for i in range(3)]).encode()
+    for _ in range(args.messages):
+        dispatcher.publish(payload)
+        time.sleep(args.interval)
+    time.sleep(args.timeout + 1)
+
+    print(f"{args.messages} payloads every {args.interval}s, {args.workers} workers")
+    print(f"{'receiver':<8}{'delivered':>10}{'failed':>8}{'retries':>9}{'coalesced':>11}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'requests':>10}{'conns':>7}")
+    metrics = dispatcher.metrics()['endpoints']
+    down = ('down', None, {'requests': 0, 'connections': ()})
+    for url, m in zip(dispatcher.urls(), metrics):
+        behaviour, _, state = receivers.get(url, down)
+        lat = m['latency_ms'] or {'p50': '-', 'p95': '-'}
+        print(f"{behaviour:<8}{m['delivered']:>10}{m['failed']:>8}{m['retries']:>9}"
+              f"{m['coalesced']:>11}{lat['p50']:>9}{lat['p95']:>9}"
+              f"{state['requests']:>10}{len(state['connections']):>7}")
+    for _, server, _ in receivers.values():
+        server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('fixtures', help='save listing/detail HTML fixtures')
+    p.add_argument('dir')
+    p.add_argument('--channel', default='BBC')
+    p.add_argument('--details', type=int, default=50)
+    p.set_defaults(func=cmd_fixtures)
+
+    p = sub.add_parser('parsers', help='CPU time per page for each HTML backend')
+    p.add_argument('dir', nargs='?', default=FIXTURES_DIR)
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=cmd_parsers)
+
+    p = sub.add_parser('loader', help='rows/sec of the per-record vs bulk DB loader')
+    p.add_argument('--records', type=int, nargs='+', default=[10000, 100000])
+    p.set_defaults(func=cmd_loader)
+
+    p = sub.add_parser('pipeline', help='subprocess + txt vs in-process scrape-to-DB pipeline')
+    p.add_argument('--records', type=int, default=2500, help='records per channel')
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=cmd_pipeline)
+
+    p = sub.add_parser('listing', help='conditional listing fetch against a local stub site')
+    p.add_argument('dir', nargs='?', default=FIXTURES_DIR,
+                   help='fixtures directory (see the fixtures command)')
+    p.set_defaults(func=cmd_listing)
+
+    p = sub.add_parser('changes', help='full reload vs per-day diff of an (un)changed listing')
+    p.add_argument('--records', type=int, default=2500, help='records per channel')
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=cmd_changes)
+
+    p = sub.add_parser('swap', help='API reads and load/copy cost while the loader writes in place vs via snapshots')
+    p.add_argument('--records', type=int, default=100000)
+    p.add_argument('--seconds', type=float, default=10)
+    p.add_argument('--readers', type=int, default=2)
+    p.set_defaults(func=cmd_swap)
+
+    p = sub.add_parser('parse', help='throughput and peak RSS of the tv_programs parsers')
+    p.add_argument('--records', type=int, default=1000000)
+    p.set_defaults(func=cmd_parse)
+
+    p = sub.add_parser('nowplaying', help='single-query vs per-channel current-or-next')
+    p.add_argument('--channels', type=int, default=500)
+    p.add_argument('--days', type=int, default=7)
+    p.add_argument('--repeat', type=int, default=1)
+    p.set_defaults(func=cmd_nowplaying)
+
+    p = sub.add_parser('viewers', help='scalar vs numpy viewer simulation')
+    p.add_argument('--channels', type=int, default=10000)
+    p.add_argument('--ticks', type=int, default=20)
+    p.add_argument('--seed', type=int, default=1)
+    p.set_defaults(func=cmd_viewers)
+
+    p = sub.add_parser('keywords', help='per-keyword scan vs Aho-Corasick popularity matcher')
+    p.add_argument('--keywords', type=int, nargs='+', default=[12, 1000, 5000])
+    p.add_argument('--titles', type=int, default=2000)
+    p.add_argument('--seed', type=int, default=1)
+    p.set_defaults(func=cmd_keywords)
+
+    p = sub.add_parser('sse', help='memory/CPU of the SSE hub per 1,000 subscribers')
+    p.add_argument('--clients', type=int, nargs='+', default=[1000, 5000])
+    p.add_argument('--messages', type=int, default=20)
+    p.add_argument('--channels', type=int, default=3, help='entries in the viewers payload')
+    p.add_argument('--slow', type=int, default=0, help='clients that never read')
+    p.set_defaults(func=cmd_sse)
+
+    p = sub.add_parser('webhooks', help='webhook dispatcher against local stub receivers')
+    p.add_argument('--messages', type=int, default=20)
+    p.add_argument('--interval', type=float, default=0.2)
+    p.add_argument('--workers', type=int, default=4)
+    p.add_argument('--timeout', type=float, default=5)
+    p.set_defaults(func=cmd_webhooks)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Fail if an API query falls back to a full table scan.
+
+    python check_query_plans.py          # fresh schema from load_tv_programs_sqlite
+    python check_query_plans.py DB       # an existing database (read-only)
+
+Runs EXPLAIN QUERY PLAN for every query the now-playing endpoints issue and
+exits 1 when a step scans a table or an index instead of searching it, e.g.
+after a schema or query change drops the index the lookup relies on. Scans
+that are expected are listed in ALLOWED_SCANS.
+"""
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+import flask_now_playing as api
+import load_tv_programs_sqlite as loader
+
+# endpoint -> queries it runs
+QUERIES = {
+    'get_current_or_next_today_slim': [api.CURRENT_OR_NEXT_SQL],
+    # per-channel reference kept for bench.py
+    'current_or_next_per_channel': [
+        api.CHANNELS_SQL, api.CURRENT_PROGRAM_SQL, api.NEXT_PROGRAM_SQL,
+    ],
+    # now_playing_api / now_playing_direct read the ScheduleIndex built from:
+    'ScheduleIndex': [api.SCHEDULE_WINDOW_SQL],
+}
+
+# sql -> scan steps it is allowed to take
+ALLOWED_SCANS = {
+    # DISTINCT channel reads the whole (small) channel index; only the
+    # per-channel reference path runs it
+    api.CHANNELS_SQL: {'SCAN program_info USING COVERING INDEX idx_info_channel'},
+}
+
+
+def full_scans(conn, sql):
+    """Return the plan steps of sql that scan a table or index instead of a SEARCH."""
+    named = re.findall(r':(\w+)', sql)
+    params = dict.fromkeys(named, 'x') if named else ['x'] * sql.count('?')
+    steps = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+    allowed = ALLOWED_SCANS.get(sql, set())
+    # a subquery's rows are already narrowed by its own (checked) steps
+    return [s for s in steps
+            if s.startswith('SCAN') and s not in allowed and not s.startswith('SCAN (subquery')]
+
+
+def check(conn):
+    failures = []
+    for endpoint, queries in QUERIES.items():
+        for sql in queries:
+            for step in full_scans(conn, sql):
+                failures.append(f"{endpoint}: {step}\n{sql.strip()}")
+    return failures
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    with tempfile.TemporaryDirectory() as tmp:
+        if argv:
+            conn = sqlite3.connect(f'file:{argv[0]}?mode=ro', uri=True)
+        else:
+            conn = sqlite3.connect(os.path.join(tmp, 'plans.db'))
+            loader.init_db(conn)
+        failures = check(conn)
+        conn.close()
+
+    for failure in failures:
+        print(f"FULL SCAN in {failure}\n")
+    if failures:
+        return 1
+    print(f"OK: {sum(len(q) for q in QUERIES.values())} queries use indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
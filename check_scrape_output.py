@@ -0,0 +1,123 @@
+"""Fail if the scraper's txt output drifts from the committed fixture output.
+
+    python check_scrape_output.py          # fixtures/
+    python check_scrape_output.py DIR      # DIR/listing/BBC.html, DIR/detail/*.html
+
+Serves the fixture pages from a local stub site, scrapes them as the BBC
+channel for the week of FIXTURE_DATE and compares the file byte for byte with
+DIR/tv_programs_BBC.txt, which the original single-channel scraper wrote from
+the same pages. The scrape runs cold, again from the warm detail cache, and
+once more after a DB-backed scrape without output (the in-process pipeline)
+has filled a cache from program_info. Listing validators are saved as the
+pipeline saves them, so the warm pass (output file deleted) and the last
+pass (listing already taken in by the DB) must still parse the listing. The
+script exits 1 when any output differs or a listing is wrongly skipped.
+"""
+import filecmp
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import load_tv_programs_sqlite as loader
+import scraper
+from detail_cache import DetailCache
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+FIXTURE_DATE = datetime(2025, 11, 6)
+LISTING_PATH = '/bbc-earth/cely-den/'
+
+
+def fixture_name(link):
+    """File name of the detail page for ``link`` under DIR/detail."""
+    return link.strip('/').replace('/', '_') + '.html'
+
+
+def serve_fixtures(root):
+    """Start a stub site serving root's listing at LISTING_PATH and its detail
+    pages at their links; returns the server (its port is server_address[1])."""
+    root = Path(root)
+    listing = sorted((root / 'listing').glob('*.html'))[0].read_bytes()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path == LISTING_PATH:
+                body = listing
+            else:
+                page = root / 'detail' / fixture_name(self.path)
+                body = page.read_bytes() if page.exists() else None
+            self.send_response(200 if body is not None else 404)
+            body = body or b''
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    root = Path(argv[0]) if argv else FIXTURES_DIR
+    expected = root / 'tv_programs_BBC.txt'
+    server = serve_fixtures(root)
+    scraper.SITE_URL = f'http://127.0.0.1:{server.server_address[1]}'
+    scraper.detail_limiter = scraper.RateLimiter(0)  # local stub, no politeness needed
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'tv_programs_BBC.txt')
+        channel = scraper.Channel('BBC', scraper.SITE_URL + LISTING_PATH, output)
+        store = DetailCache(os.path.join(tmp, 'cache.db'))
+        session = scraper.make_session()
+
+        # program_info holding the expected programs; its details are tagged so
+        # any that reach the txt in place of page text show up in the diff
+        db = os.path.join(tmp, 'tvguide.db')
+        with loader.writable_db(db, 'inplace') as conn:
+            loader.load(conn, loader.parse_file(expected))
+        known = {link: {**details, 'Original Name': details['Original Name'] + ' [db]'}
+                 for link, details in scraper.known_link_details(db).items()}
+        db_store = DetailCache(os.path.join(tmp, 'db_cache.db'))
+
+        for label, cache in (('cold cache', store), ('warm cache', store),
+                             ('after a DB-backed scrape', db_store)):
+            if cache is db_store:
+                _, validators = scraper.scrape_channel(channel, {}, FIXTURE_DATE, cache, session,
+                                                       known, output=False)
+                cache.put_listing(**validators)
+                if not cache.stats['skipped']:
+                    print(f"{label}: the DB-backed scrape took no details from the DB")
+                    failures.append(label)
+            elif os.path.exists(output):
+                os.remove(output)
+            programs, validators = scraper.scrape_channel(channel, {}, FIXTURE_DATE, cache, session)
+            if programs is None:
+                print(f"{label}: listing taken as unchanged, {output} not written")
+                failures.append(label)
+                continue
+            cache.put_listing(**validators)
+            same = filecmp.cmp(output, expected, shallow=False)
+            print(f"{label}: {'identical' if same else 'DIFFERS from ' + str(expected)}")
+            if not same:
+                failures.append(label)
+        session.close()
+        store.close()
+        db_store.close()
+    server.shutdown()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Persistent cache of program detail pages, shared across scraper runs.
+
+Entries are keyed by the relative /program/... link and hold the parsed
+details plus the ETag/Last-Modified validators of the page. Within the TTL
+an entry is used without touching the network; after that the scraper
+revalidates it with a conditional request, and entries nobody has confirmed
+for DETAIL_CACHE_MAX_AGE_DAYS are evicted.
+
+The same database keeps the validators of each channel's listing page
+(ETag, Last-Modified and a hash of the body, plus the base date the page
+was parsed for), so an unchanged listing can be recognised before parsing.
+They are kept per consumer ('file' for the txt output, 'db' for in-process
+loads): a listing one of them has taken in may still be new to the other.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def _default_path():
+    return '/app/data/detail_cache.db' if os.path.isdir('/app/data') else 'detail_cache.db'
+
+
+DETAIL_CACHE_PATH = os.getenv('DETAIL_CACHE_PATH') or _default_path()
+DETAIL_CACHE_TTL_HOURS = float(os.getenv('DETAIL_CACHE_TTL_HOURS', 72))
+DETAIL_CACHE_MAX_AGE_DAYS = float(os.getenv('DETAIL_CACHE_MAX_AGE_DAYS', 30))
+# How long a write waits for another scraper process holding the cache's lock
+DETAIL_CACHE_TIMEOUT_SEC = float(os.getenv('DETAIL_CACHE_TIMEOUT_SEC', 30))
+
+DDL = """
+CREATE TABLE IF NOT EXISTS detail_cache (
+  link          TEXT PRIMARY KEY,
+  details       TEXT NOT NULL,   -- JSON of the scraper's detail fields
+  etag          TEXT,
+  last_modified TEXT,
+  fetched_at    REAL NOT NULL,   -- unix time of the last 200 response
+  checked_at    REAL NOT NULL,   -- unix time of the last 200 or 304
+  origin        TEXT NOT NULL DEFAULT 'page'  -- 'page', or 'db' when taken from program_info
+)
+"""
+
+LISTING_DDL = """
+CREATE TABLE IF NOT EXISTS listing_cache (
+  url           TEXT NOT NULL,
+  consumer      TEXT NOT NULL,   -- what the listing was handed on to: 'file' or 'db'
+  etag          TEXT,
+  last_modified TEXT,
+  body_hash     TEXT NOT NULL,   -- blake2b of the response body
+  base_date     TEXT NOT NULL,   -- ISO date the day names were resolved against
+  checked_at    REAL NOT NULL,
+  PRIMARY KEY (url, consumer)
+)
+"""
+
+
+class DetailCache:
+    """Thread-safe SQLite-backed {link: details} store with TTL and validators."""
+
+    def __init__(self, path=DETAIL_CACHE_PATH,
+                 ttl_hours=DETAIL_CACHE_TTL_HOURS,
+                 max_age_days=DETAIL_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.ttl_sec = ttl_hours * 3600
+        self.max_age_sec = max_age_days * 86400
+        self.stats = {'hit': 0, 'skipped': 0, 'revalidated': 0, 'fetched': 0, 'error': 0,
+                      'listing_not_modified': 0, 'listing_identical': 0, 'listing_parsed': 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=DETAIL_CACHE_TIMEOUT_SEC,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("PRAGMA synchronous=NORMAL;")
+        self._conn.execute(DDL)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(detail_cache)")}
+        if 'origin' not in columns:  # cache written before entries had an origin
+            self._conn.execute("ALTER TABLE detail_cache ADD COLUMN origin TEXT NOT NULL DEFAULT 'page'")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(listing_cache)")}
+        if columns and 'consumer' not in columns:  # keyed by url alone: parse each listing once more
+            self._conn.execute("DROP TABLE listing_cache")
+        self._conn.execute(LISTING_DDL)
+        self._conn.commit()
+
+    def get(self, link):
+        """Return {details, etag, last_modified, fresh, origin} for link, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT details, etag, last_modified, checked_at, origin FROM detail_cache WHERE link=?",
+                (link,)
+            ).fetchone()
+        if not row:
+            return None
+        details, etag, last_modified, checked_at, origin = row
+        return {
+            'details': json.loads(details),
+            'etag': etag,
+            'last_modified': last_modified,
+            'fresh': time.time() - checked_at < self.ttl_sec,
+            'origin': origin,
+        }
+
+    def put(self, link, details, etag=None, last_modified=None, origin='page'):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO detail_cache (link, details, etag, last_modified, fetched_at, checked_at, origin)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(link) DO UPDATE SET
+                  details=excluded.details, etag=excluded.etag,
+                  last_modified=excluded.last_modified,
+                  fetched_at=excluded.fetched_at, checked_at=excluded.checked_at,
+                  origin=excluded.origin
+            """, (link, json.dumps(details, ensure_ascii=False), etag, last_modified, now, now,
+                  origin))
+
+    def touch(self, link):
+        """Mark link as confirmed unchanged (after a 304)."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE detail_cache SET checked_at=? WHERE link=?",
+                               (time.time(), link))
+
+    def get_listing(self, url, consumer):
+        """Return {etag, last_modified, body_hash, base_date} of the last listing at url
+        handed on to consumer, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body_hash, base_date FROM listing_cache"
+                " WHERE url=? AND consumer=?",
+                (url, consumer)
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('etag', 'last_modified', 'body_hash', 'base_date'), row))
+
+    def put_listing(self, url, consumer, etag, last_modified, body_hash, base_date):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO listing_cache (url, consumer, etag, last_modified, body_hash, base_date,
+                                           checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url, consumer) DO UPDATE SET
+                  etag=excluded.etag, last_modified=excluded.last_modified,
+                  body_hash=excluded.body_hash, base_date=excluded.base_date,
+                  checked_at=excluded.checked_at
+            """, (url, consumer, etag, last_modified, body_hash, base_date, time.time()))
+
+    def count(self, kind):
+        with self._lock:
+            self.stats[kind] += 1
+
+    def evict(self):
+        """Drop entries not confirmed within max_age; returns the number removed."""
+        with self._lock, self._conn:
+            cur = self._conn.execute("DELETE FROM detail_cache WHERE checked_at < ?",
+                                     (time.time() - self.max_age_sec,))
+        return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,12 +1,18 @@
 # app.py
 from flask import Flask, request, redirect, Response
+from bisect import bisect_right
 from datetime import datetime, timedelta
-import os, time, threading, json, queue
+import os, time, threading, json, sqlite3, gzip, hashlib
 from werkzeug.middleware.proxy_fix import ProxyFix
-from urllib import request as urlrequest
-from urllib.error import URLError, HTTPError
+from urllib.parse import urlsplit
 import random
 
+from sse_hub import SSEHub, SSE_PORT, sse_frame
+from keyword_matcher import PopularityMatcher, load_keyword_tables
+from shared_state import STATE_DIR, STATE_POLL_SEC, JSONFile, LeaderLock
+from viewer_engine import ViewerEngine, np
+from webhook_dispatcher import WebhookDispatcher
+
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 
@@ -24,8 +30,7 @@ def test_route():
 @app.route('/refresh')
 def refresh_now_playing():
     """Force refresh the now-playing data"""
-    global now_playing
-    now_playing = get_current_or_next_today_slim()
+    _set_now_playing(get_current_or_next_today_slim())
     return Response(json.dumps({
         "message": "Now playing data refreshed",
         "count": len(now_playing),
@@ -96,22 +101,6 @@ def _force_https():
             return redirect(url, code=301)
 
 # ------------ parsing helpers ------------
-def parse_programs(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    blocks = content.strip().split('----------------------------------------')
-    programs = []
-    for block in blocks:
-        lines = block.strip().split('\n')
-        record = {}
-        for line in lines:
-            if ': ' in line:
-                key, value = line.split(': ', 1)
-                record[key.strip()] = value.strip()
-        if record:
-            programs.append(record)
-    return programs
-
 def _as_dt(date_str, hm_str):
     if not date_str or not hm_str:
         return None
@@ -132,10 +121,194 @@ def _channel_name_from_file(filename: str) -> str:
     }
     return mapping.get(short, short)
 
+# ------------ SQL (plans checked by check_query_plans.py) ------------
+CHANNELS_SQL = "SELECT DISTINCT channel FROM program_info"
+
+# Current program of one channel
+CURRENT_PROGRAM_SQL = '''
+    SELECT pi.title, pi.channel, ps.start_time, ps.end_time, ps.air_date
+    FROM program_info pi
+    JOIN program_schedule ps ON pi.id = ps.program_id
+    WHERE ps.air_date = ? 
+      AND pi.channel = ?
+      AND ps.start_time <= ? 
+      AND ps.end_time > ?
+    ORDER BY ps.start_time
+    LIMIT 1
+'''
+
+# Next program of one channel
+NEXT_PROGRAM_SQL = '''
+    SELECT pi.title, pi.channel, ps.start_time, ps.end_time, ps.air_date
+    FROM program_info pi
+    JOIN program_schedule ps ON pi.id = ps.program_id
+    WHERE ps.air_date = ? 
+      AND pi.channel = ?
+      AND ps.start_time > ?
+    ORDER BY ps.start_time
+    LIMIT 1
+'''
+
+# Current program of every channel, or its next one when nothing is on air:
+# per channel, slots on air sort before upcoming ones, then by start time
+CURRENT_OR_NEXT_SQL = '''
+    SELECT title, channel, start_time
+    FROM (
+        SELECT pi.title, pi.channel, ps.start_time,
+               ROW_NUMBER() OVER (
+                   PARTITION BY pi.channel
+                   ORDER BY ps.start_time > :at, ps.start_time
+               ) AS rn
+        FROM program_schedule ps
+        JOIN program_info pi ON pi.id = ps.program_id
+        WHERE ps.air_date = :air_date
+          AND pi.channel IS NOT NULL
+          AND (ps.start_time > :at OR (ps.start_time <= :at AND ps.end_time > :at))
+    )
+    WHERE rn = 1
+    ORDER BY channel
+'''
+
+# Every slot of two air dates (ScheduleIndex build)
+SCHEDULE_WINDOW_SQL = '''
+    SELECT ps.air_date, pi.channel, ps.start_time, ps.end_time, pi.title
+    FROM program_info pi
+    JOIN program_schedule ps ON pi.id = ps.program_id
+    WHERE ps.air_date IN (?, ?)
+      AND ps.start_time IS NOT NULL
+      AND ps.end_time IS NOT NULL
+    ORDER BY pi.channel, ps.start_time
+'''
+
+# ------------ in-memory schedule index ------------
+INDEX_CHECK_SEC = float(os.getenv("INDEX_CHECK_SEC", "1"))
+
+class ScheduleIndex:
+    """Today's and tomorrow's schedule held in memory for now-playing lookups.
+
+    Per air date and channel the slots are sorted by start time, so "what is on
+    at HH:MM:SS" is a bisect plus a short walk back. At most once every
+    INDEX_CHECK_SEC the DB file identity/mtime and PRAGMA data_version are
+    compared with the loaded snapshot; on a change (or a new day) the index is
+    rebuilt off to the side and swapped in with a single assignment.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_ino = None
+        self._sig = None
+        self._next_check = 0.0
+        # (version, {air_date: [(channel, starts, slots, prefix_max_end), ...]}),
+        # channels sorted; replaced as a whole so readers see one consistent build
+        self._snapshot = (0, {})
+
+    def _connect(self):
+        st = os.stat(self.db_path)
+        # a snapshot publish (DB_PUBLISH=snapshot) re-points the path at a new file
+        if self._conn is None or st.st_ino != self._conn_ino:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                         check_same_thread=False)
+            self._conn_ino = st.st_ino
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return (st.st_ino, st.st_mtime_ns, version)
+
+    def _build(self, dates):
+        rows = self._conn.execute(SCHEDULE_WINDOW_SQL, dates).fetchall()
+        per_day = {d: {} for d in dates}
+        for air_date, channel, start, end, title in rows:
+            per_day[air_date].setdefault(channel, []).append((start, end, title))
+        days = {}
+        for air_date, channels in per_day.items():
+            entries = []
+            for channel in sorted(channels, key=lambda c: (c is not None, c or "")):
+                slots = channels[channel]
+                prefix_max_end, running = [], ""
+                for _, end, _ in slots:
+                    running = max(running, end)
+                    prefix_max_end.append(running)
+                entries.append((channel, [s[0] for s in slots], slots, prefix_max_end))
+            days[air_date] = entries
+        return days
+
+    def _refresh(self, today):
+        now = time.monotonic()
+        if now < self._next_check and today in self._snapshot[1]:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check and today in self._snapshot[1]:
+                return
+            self._next_check = now + INDEX_CHECK_SEC
+            version = self._snapshot[0]
+            if not os.path.exists(self.db_path):
+                if self._sig is not None:
+                    self._snapshot, self._sig = (version + 1, {}), None
+                return
+            sig = self._connect()
+            if sig != self._sig or today not in self._snapshot[1]:
+                tomorrow = (datetime.strptime(today, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+                self._snapshot = (version + 1, self._build((today, tomorrow)))
+                self._sig = sig
+
+    def lookup(self, air_date, at_time):
+        """Return (version, programs, next_change) for at_time ('HH:MM:SS').
+
+        programs are (title, channel, start, end) ordered by channel then start,
+        or None when the database does not exist. next_change is the earliest
+        start/end after at_time ('HH:MM:SS', None if nothing changes before
+        midnight): until then, and while version stays the same, the answer
+        cannot change.
+        """
+        self._refresh(air_date)
+        version, days = self._snapshot
+        if air_date not in days:
+            return version, None, None
+        result = []
+        next_change = None
+        for channel, starts, slots, prefix_max_end in days[air_date]:
+            found = []
+            j = bisect_right(starts, at_time)
+            if j < len(starts) and (next_change is None or starts[j] < next_change):
+                next_change = starts[j]
+            i = j - 1
+            # walk back only while an earlier slot could still be running
+            while i >= 0 and prefix_max_end[i] > at_time:
+                start, end, title = slots[i]
+                if end > at_time:
+                    found.append((title, channel, start, end))
+                    if next_change is None or end < next_change:
+                        next_change = end
+                i -= 1
+            result.extend(reversed(found))
+        return version, result, next_change
+
+    def current(self, air_date, at_time):
+        """Programs on air at at_time; see lookup()."""
+        return self.lookup(air_date, at_time)[1]
+
+schedule_index = ScheduleIndex(os.getenv('DB_PATH', '/app/data/tvguide.db'))
+
 # ------------ selection (programs for today) ------------
+def current_or_next(conn, air_date, at_time):
+    """(title, channel, start) of the current-or-next program of every channel."""
+    return conn.execute(CURRENT_OR_NEXT_SQL, {"air_date": air_date, "at": at_time}).fetchall()
+
+def current_or_next_per_channel(conn, air_date, at_time):
+    """Same as current_or_next() with one or two queries per channel (reference)."""
+    rows = []
+    for (channel,) in conn.execute(CHANNELS_SQL).fetchall():
+        row = conn.execute(CURRENT_PROGRAM_SQL, (air_date, channel, at_time, at_time)).fetchone()
+        if not row:
+            # If no current program, find next program
+            row = conn.execute(NEXT_PROGRAM_SQL, (air_date, channel, at_time)).fetchone()
+        if row:
+            rows.append(row[:3])
+    return rows
+
 def get_current_or_next_today_slim():
-    import sqlite3
-    
     now = datetime.now()
     today_str = now.strftime('%Y-%m-%d')
     current_time = now.strftime('%H:%M:%S')
@@ -147,63 +320,14 @@ def get_current_or_next_today_slim():
     result = []
     try:
         conn = sqlite3.connect(db_path)
-        
-        # Get channels
-        cursor = conn.execute("SELECT DISTINCT channel FROM program_info")
-        channels = [row[0] for row in cursor.fetchall()]
-        
-        for channel in channels:
-            # Query for current programs
-            query = '''
-                SELECT pi.title, pi.channel, ps.start_time, ps.end_time, ps.air_date
-                FROM program_info pi
-                JOIN program_schedule ps ON pi.id = ps.program_id
-                WHERE ps.air_date = ? 
-                  AND pi.channel = ?
-                  AND ps.start_time <= ? 
-                  AND ps.end_time > ?
-                ORDER BY ps.start_time
-                LIMIT 1
-            '''
-            
-            cursor = conn.execute(query, (today_str, channel, current_time, current_time))
-            current_result = cursor.fetchone()
-            
-            if current_result:
-                program = {
-                    'channel': current_result[1],
-                    'title': current_result[0], 
-                    'start': current_result[2],
-                    'date': today_str,
-                    'csfd_id': ''
-                }
-                result.append(program)
-            else:
-                # If no current program, find next program
-                next_query = '''
-                    SELECT pi.title, pi.channel, ps.start_time, ps.end_time, ps.air_date
-                    FROM program_info pi
-                    JOIN program_schedule ps ON pi.id = ps.program_id
-                    WHERE ps.air_date = ? 
-                      AND pi.channel = ?
-                      AND ps.start_time > ?
-                    ORDER BY ps.start_time
-                    LIMIT 1
-                '''
-                
-                cursor = conn.execute(next_query, (today_str, channel, current_time))
-                next_result = cursor.fetchone()
-                
-                if next_result:
-                    program = {
-                        'channel': next_result[1],
-                        'title': next_result[0], 
-                        'start': next_result[2],
-                        'date': today_str,
-                        'csfd_id': ''
-                    }
-                    result.append(program)
-        
+        for title, channel, start in current_or_next(conn, today_str, current_time):
+            result.append({
+                'channel': channel,
+                'title': title,
+                'start': start,
+                'date': today_str,
+                'csfd_id': ''
+            })
         conn.close()
     except Exception as e:
         print(f"Database error in get_current_or_next_today_slim: {e}")
@@ -212,42 +336,24 @@ def get_current_or_next_today_slim():
     return result
 
 # ------------ subscriptions infra (SSE + webhooks) ------------
-_sse_clients = set()
-_sse_lock = threading.Lock()
-_webhook_urls = set()
-_webhook_lock = threading.Lock()
+# SSE subscribers live on the hub's asyncio loop (SSE_PORT), not on Flask threads
+sse_hub = SSEHub()
+# webhook delivery workers (leader only); the URL list is shared by all workers
+webhooks = WebhookDispatcher()
+webhook_urls_file = JSONFile(os.path.join(STATE_DIR, "webhooks.json"))
+webhook_metrics_file = JSONFile(os.path.join(STATE_DIR, "webhook_metrics.json"))
 
 def _broadcast_to_subscribers(payload):
     data_str = json.dumps(payload, ensure_ascii=False)
 
-    # SSE queues
-    with _sse_lock:
-        dead = []
-        for q in _sse_clients:
-            try:
-                q.put_nowait(data_str)
-            except Exception:
-                dead.append(q)
-        for q in dead:
-            _sse_clients.discard(q)
-
-    # Webhooks (fire-and-forget)
-    def _post_webhooks(body: bytes):
-        with _webhook_lock:
-            urls = list(_webhook_urls)
-        for url in urls:
-            try:
-                req = urlrequest.Request(
-                    url=url,
-                    data=body,
-                    headers={"Content-Type": "application/json"},
-                    method="POST"
-                )
-                urlrequest.urlopen(req, timeout=5)
-            except (HTTPError, URLError, TimeoutError):
-                pass
-
-    threading.Thread(target=_post_webhooks, args=(data_str.encode("utf-8"),), daemon=True).start()
+    # SSE: serialised once, fanned out by the hub
+    sse_hub.publish(data_str)
+
+    # Webhooks: queued per endpoint, delivered by the dispatcher's pool
+    _, urls = webhook_urls_file.read()
+    webhooks.set_urls(urls or [])
+    webhooks.publish(data_str.encode("utf-8"))
+    webhook_metrics_file.write(webhooks.metrics())
 
 # ------------ server-side config ------------
 CONFIG = {
@@ -260,6 +366,20 @@ CONFIG = {
     "SMOOTH_ALPHA": 0.35,
     # SSE ping (0 disables)
     "SSE_KEEPALIVE_SEC": 0,
+    # /subscribe streams on this port per worker, each holding a thread; keep it
+    # below gunicorn's threads. Further clients go to the hub on SSE_PORT (503 without one)
+    "SUBSCRIBE_FALLBACK_MAX": int(os.getenv("SUBSCRIBE_FALLBACK_MAX", "4")),
+    # where clients reach the hub, e.g. https://tv.example.com/sse/subscribe behind a
+    # proxy; unset = this host on SSE_PORT, for direct plain-http requests only
+    "SSE_PUBLIC_URL": os.getenv("SSE_PUBLIC_URL", ""),
+    # upper bound for /now-playing max-age (a reload can change the answer early)
+    "NOW_PLAYING_MAX_AGE_SEC": int(os.getenv("NOW_PLAYING_MAX_AGE_SEC", "300")),
+    # bodies at least this large also get a precomputed gzip variant
+    "GZIP_MIN_BYTES": int(os.getenv("GZIP_MIN_BYTES", "512")),
+    # "scalar" = loop below, "numpy" = vectorised ViewerEngine (opt-in, needs numpy)
+    "VIEWER_ENGINE": os.getenv("VIEWER_ENGINE", "scalar"),
+    # seed for the viewer simulation's random draws (unset = unseeded)
+    "VIEWER_SEED": int(os.environ["VIEWER_SEED"]) if os.getenv("VIEWER_SEED") else None,
 }
 
 # Hour-of-day weights (local time): (lo, hi, multiplier)
@@ -286,6 +406,13 @@ UNPOPULAR_SHOW_KEYWORDS = {
     "rerun": 0.88, "repeat": 0.90, "marathon": 0.92,
     "behind the scenes": 0.92, "recap": 0.90, "infomercial": 0.80,
 }
+# JSON {"popular": {...}, "unpopular": {...}} replacing either table above
+POPULARITY_KEYWORDS_FILE = os.getenv("POPULARITY_KEYWORDS_FILE")
+if POPULARITY_KEYWORDS_FILE:
+    _tables = load_keyword_tables(POPULARITY_KEYWORDS_FILE)
+    POPULAR_SHOW_KEYWORDS = _tables.get("popular", POPULAR_SHOW_KEYWORDS)
+    UNPOPULAR_SHOW_KEYWORDS = _tables.get("unpopular", UNPOPULAR_SHOW_KEYWORDS)
+_popularity = PopularityMatcher(POPULAR_SHOW_KEYWORDS, UNPOPULAR_SHOW_KEYWORDS)
 
 def _hour_factor_v2(h: int) -> float:
     for lo, hi, f in HOUR_BANDS_V2:
@@ -294,18 +421,8 @@ def _hour_factor_v2(h: int) -> float:
     return 1.0
 
 def _popularity_factor(title: str | None) -> float:
-    """Heuristic multiplier from program title (case-insensitive)."""
-    if not title:
-        return 1.0
-    t = title.lower()
-    best = 1.0
-    for k, m in POPULAR_SHOW_KEYWORDS.items():
-        if k in t:
-            best = max(best, m)
-    for k, m in UNPOPULAR_SHOW_KEYWORDS.items():
-        if k in t:
-            best = min(best, m)
-    return best
+    """Heuristic multiplier from program title (case-insensitive, memoised)."""
+    return _popularity.factor(title)
 
 def _clamp_delta_per_tick(prev: float | None, prev_ts: datetime | None,
                           new_val: float, now: datetime) -> float:
@@ -325,7 +442,8 @@ def _clamp_delta_per_tick(prev: float | None, prev_ts: datetime | None,
     return new_val
 
 def generate_viewers_snapshot(now: datetime,
-                              current_titles: dict[str, str] | None = None) -> list[dict]:
+                              current_titles: dict[str, str] | None = None,
+                              channels: list[str] | None = None) -> list[dict]:
     """
     Returns: [{ "channel": str, "viewers": str }, ...]
     - Keeps values inside 2000–5000
@@ -337,9 +455,9 @@ def generate_viewers_snapshot(now: datetime,
     out = []
     bmin, bmax = CONFIG["BASELINE_MIN"], CONFIG["BASELINE_MAX"]
 
-    for filename in FILES:
-        channel = _channel_name_from_file(filename)
-
+    if channels is None:
+        channels = [_channel_name_from_file(f) for f in FILES]
+    for channel in channels:
         # hour & program multipliers
         hour_f = _hour_factor_v2(now.hour)
         title = (current_titles or {}).get(channel)
@@ -370,42 +488,136 @@ def generate_viewers_snapshot(now: datetime,
         out.append({"channel": channel, "viewers": str(int(round(clamped)))})
     return out
 
+# ------------ response caching ------------
+class CachedBody:
+    """Serialized JSON response plus its strong ETag and optional gzip variant."""
+    __slots__ = ("body", "gzipped", "etag")
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.gzipped = None
+        if len(self.body) >= CONFIG["GZIP_MIN_BYTES"]:
+            self.gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+
+def _cached_response(cached: CachedBody, max_age: float) -> Response:
+    """200 with the cached body, or 304 when If-None-Match matches it."""
+    use_gzip = cached.gzipped is not None and request.accept_encodings["gzip"] > 0
+    # each encoding is a different representation, so it gets its own strong tag
+    etag = cached.etag + "-gz" if use_gzip else cached.etag
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={max(0, int(max_age))}",
+        "Vary": "Accept-Encoding",
+    }
+    inm = request.if_none_match
+    if inm and (inm.contains_weak(cached.etag) or inm.contains_weak(cached.etag + "-gz")):
+        return Response(status=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(cached.gzipped, headers=headers, mimetype="application/json")
+    return Response(cached.body, headers=headers, mimetype="application/json")
+
+def _seconds_until(now: datetime, hms: str | None) -> float:
+    """Seconds from now to today's hms ('HH:MM:SS'), or to midnight for None."""
+    if hms is None:
+        boundary = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    else:
+        try:
+            boundary = datetime.combine(now.date(), datetime.strptime(hms, "%H:%M:%S").time())
+        except ValueError:
+            return 0
+    return (boundary - now).total_seconds()
+
+# endpoint -> ((index version, date, next boundary), CachedBody); the answer of
+# the index is constant between two program boundaries, so one body serves
+# every request in that window
+_now_playing_bodies = {}
+
+def _now_playing_response(endpoint, now, programs, version, next_change, render):
+    key = (version, now.date(), next_change)
+    entry = _now_playing_bodies.get(endpoint)
+    if entry is None or entry[0] != key:
+        entry = (key, CachedBody(render(programs)))
+        _now_playing_bodies[endpoint] = entry
+    max_age = min(_seconds_until(now, next_change), CONFIG["NOW_PLAYING_MAX_AGE_SEC"])
+    return _cached_response(entry[1], max_age)
+
+# (CachedBody, time.time() of the tick), rebuilt by _set_latest_viewers
+_viewers_body = None
+
+def _set_latest_viewers(viewers, tick=None):
+    global latest_viewers, _viewers_body
+    latest_viewers = viewers
+    _viewers_body = (CachedBody(viewers), tick or time.time())
+
 # ------------ endpoints ------------
 @app.get("/viewers")
 def viewers_pull():
     """Plain JSON pull of the latest viewers array (no SSE framing)."""
-    return Response(json.dumps(latest_viewers, ensure_ascii=False, indent=2),
-                    mimetype="application/json")
+    if _viewers_body is None:  # schedulers not started
+        return _cached_response(CachedBody(latest_viewers), 0)
+    cached, tick = _viewers_body
+    return _cached_response(cached, CONFIG["VIEWERS_INTERVAL_SEC"] - (time.time() - tick))
+
+_fallback_streams = threading.BoundedSemaphore(max(1, CONFIG["SUBSCRIBE_FALLBACK_MAX"]))
+
+def _sse_hub_url():
+    """Public URL of the SSE hub's /subscribe, or None when it cannot be told.
+
+    The hub speaks plain HTTP on SSE_PORT, so without SSE_PUBLIC_URL only a
+    direct http request is pointed at this host's hub port; behind TLS or a
+    proxy the hub's public address is unknown.
+    """
+    if CONFIG["SSE_PUBLIC_URL"]:
+        return CONFIG["SSE_PUBLIC_URL"]
+    proxied = "X-Forwarded-For" in request.headers or "X-Forwarded-Host" in request.headers
+    if not SSE_PORT or request.scheme != "http" or proxied:
+        return None
+    host = urlsplit(f"//{request.host}").hostname
+    if ":" in host:  # IPv6 literal
+        host = f"[{host}]"
+    return f"http://{host}:{SSE_PORT}/subscribe"
 
 @app.get("/subscribe")
 def subscribe_sse():
-    """SSE stream that emits ONLY the viewers array each time."""
-    client_q = queue.Queue(maxsize=10)
-    with _sse_lock:
-        _sse_clients.add(client_q)
+    """SSE stream that emits ONLY the viewers array each time.
+
+    Each client here holds a server thread; high-fan-out dashboards should
+    connect to the hub on SSE_PORT, which serves the same stream. Beyond
+    SUBSCRIBE_FALLBACK_MAX streams per worker clients are redirected there
+    (see _sse_hub_url), or get a 503 when the hub's address is unknown.
+    """
+    if not _fallback_streams.acquire(blocking=False):
+        hub_url = _sse_hub_url()
+        if hub_url:
+            return redirect(hub_url, code=307)
+        return Response(json.dumps({"error": "Too many /subscribe streams"}), status=503,
+                        headers={"Retry-After": "30"}, mimetype="application/json")
 
     def event_stream():
         # initial snapshot
-        yield f"data: {json.dumps(latest_viewers, ensure_ascii=False)}\n\n"
-        last_send = time.time()
+        seq = sse_hub.seq
+        yield sse_frame(latest_viewers)
         keepalive = CONFIG["SSE_KEEPALIVE_SEC"]
 
         while True:
-            try:
-                msg = client_q.get(timeout=1)
-                yield f"data: {msg}\n\n"
-                last_send = time.time()
-            except queue.Empty:
-                if keepalive > 0 and (time.time() - last_send) > keepalive:
-                    yield ": ping\n\n"
-                    last_send = time.time()
+            # sleeps until the next publish; a slow reader only sees the newest frame
+            new_seq, frame = sse_hub.wait(seq, keepalive if keepalive > 0 else None)
+            if new_seq == seq:
+                yield b": ping\n\n"
+            else:
+                seq = new_seq
+                yield frame
 
     headers = {
         "Content-Type": "text/event-stream",
         "Cache-Control": "no-cache, no-transform",
         "Connection": "keep-alive",
     }
-    return Response(event_stream(), headers=headers)
+    response = Response(event_stream(), headers=headers)
+    response.call_on_close(_fallback_streams.release)
+    return response
 
 @app.post("/subscribe-webhook")
 def subscribe_webhook():
@@ -414,8 +626,7 @@ def subscribe_webhook():
     if not (url.startswith("http://") or url.startswith("https://")):
         return Response(json.dumps({"error": "Provide absolute http(s) URL"}),
                         status=400, mimetype="application/json")
-    with _webhook_lock:
-        _webhook_urls.add(url)
+    webhook_urls_file.update(lambda urls: sorted(set(urls or []) | {url}))
     return Response(json.dumps({"ok": True, "subscribed": url}),
                     mimetype="application/json")
 
@@ -423,42 +634,26 @@ def subscribe_webhook():
 def unsubscribe_webhook():
     body = request.get_json(silent=True) or {}
     url = (body.get("url") or "").strip()
-    with _webhook_lock:
-        _webhook_urls.discard(url)
+    webhook_urls_file.update(lambda urls: sorted(set(urls or []) - {url}))
     return Response(json.dumps({"ok": True, "unsubscribed": url}),
                     mimetype="application/json")
 
+@app.get("/webhook-metrics")
+def webhook_metrics():
+    """Delivery counts and latency per subscribed webhook (URLs redacted)."""
+    _, metrics = webhook_metrics_file.read()  # written by the leader each tick
+    return Response(json.dumps(metrics or webhooks.metrics(), ensure_ascii=False, indent=2),
+                    mimetype="application/json")
+
 @app.route('/now-playing-direct')
 def now_playing_direct():
-    """Direct database query for current programs (bypasses global variable)"""
-    import sqlite3
-    
+    """Current programs from the in-memory schedule index (bypasses global variable)"""
     now = datetime.now()
     today_str = now.strftime('%Y-%m-%d')
     current_time = now.strftime('%H:%M:%S')
     
-    db_path = os.getenv('DB_PATH', '/app/data/tvguide.db')
-    if not os.path.exists(db_path):
-        return Response(json.dumps({"error": "Database not found"}), mimetype="application/json")
-    
-    result = []
-    try:
-        conn = sqlite3.connect(db_path)
-        
-        # Get all current programs
-        query = '''
-            SELECT pi.title, pi.channel, ps.start_time, ps.end_time
-            FROM program_info pi
-            JOIN program_schedule ps ON pi.id = ps.program_id
-            WHERE ps.air_date = ? 
-              AND ps.start_time <= ? 
-              AND ps.end_time > ?
-            ORDER BY pi.channel, ps.start_time
-        '''
-        
-        cursor = conn.execute(query, (today_str, current_time, current_time))
-        programs = cursor.fetchall()
-        
+    def render(programs):
+        result = []
         for program in programs:
             result.append({
                 "channel": program[1],
@@ -468,60 +663,43 @@ def now_playing_direct():
                 "date": today_str.replace('-', '.'),  # Convert to DD.MM.YYYY format
                 "csfd_id": ""
             })
-        
-        conn.close()
-        
+        return result
+
+    try:
+        version, programs, next_change = schedule_index.lookup(today_str, current_time)
+        if programs is None:
+            return Response(json.dumps({"error": "Database not found"}), mimetype="application/json")
+        return _now_playing_response('now-playing-direct', now, programs, version, next_change, render)
     except Exception as e:
         return Response(json.dumps({"error": f"Database error: {str(e)}"}), mimetype="application/json")
-    
-    return Response(json.dumps(result, ensure_ascii=False, indent=2), mimetype="application/json")
 
 @app.route('/now-playing')
 def now_playing_api():
-    """Programs (pull) - fixed to query database directly."""
-    import sqlite3
-    
-    # Get fresh data directly from database instead of relying on global variable
+    """Programs (pull) - binary search in the in-memory schedule index."""
+    # Fresh data from the DB-backed index instead of relying on global variable
     now = datetime.now()
     today_str = now.strftime('%Y-%m-%d')
     current_time = now.strftime('%H:%M:%S')
     
-    db_path = os.getenv('DB_PATH', '/app/data/tvguide.db')
-    
-    slim = []
+    def render(programs):
+        slim = []
+        for program in programs or []:
+            slim.append({
+                "channel": program[1],
+                "title": program[0],
+                "start": program[2],
+                "date": now.strftime('%d.%m.%Y'),
+                "csfd_id": ""
+            })
+        return slim
+
     try:
-        if os.path.exists(db_path):
-            conn = sqlite3.connect(db_path)
-            
-            # Get current programs for each channel
-            query = '''
-                SELECT pi.title, pi.channel, ps.start_time, ps.end_time
-                FROM program_info pi
-                JOIN program_schedule ps ON pi.id = ps.program_id
-                WHERE ps.air_date = ? 
-                  AND ps.start_time <= ? 
-                  AND ps.end_time > ?
-                ORDER BY pi.channel, ps.start_time
-            '''
-            
-            cursor = conn.execute(query, (today_str, current_time, current_time))
-            programs = cursor.fetchall()
-            
-            for program in programs:
-                slim.append({
-                    "channel": program[1],
-                    "title": program[0],
-                    "start": program[2],
-                    "date": now.strftime('%d.%m.%Y'),
-                    "csfd_id": ""
-                })
-            
-            conn.close()
-            
+        version, programs, next_change = schedule_index.lookup(today_str, current_time)
+        return _now_playing_response('now-playing', now, programs, version, next_change, render)
     except Exception as e:
         print(f"Error in now_playing_api: {e}")
     
-    data = json.dumps(slim, ensure_ascii=False, indent=2)
+    data = json.dumps([], ensure_ascii=False, indent=2)
     return Response(data, mimetype="application/json")
 
 # ------------ schedulers ------------
@@ -530,31 +708,64 @@ def _titles_from_now_playing() -> dict[str, str]:
 
 def scheduler_loop_programs():
     """Keeps /now-playing data fresh (pull only)."""
-    global now_playing
     last_sig = None
     while True:
         new_now = get_current_or_next_today_slim()
         sig = tuple((p["channel"], p["title"], p["start"], p["date"]) for p in new_now)
         if sig != last_sig:
-            now_playing = new_now
+            _set_now_playing(new_now)
             last_sig = sig
         time.sleep(30)
 
+_viewer_engine = None  # ViewerEngine on the leader with VIEWER_ENGINE=numpy
+
+def _next_viewers(now: datetime) -> list[dict]:
+    titles = _titles_from_now_playing()
+    if _viewer_engine is None:
+        return generate_viewers_snapshot(now, titles)
+    _viewer_engine.set_titles(titles)
+    return _viewer_engine.snapshot(now)
+
 def scheduler_loop_viewers():
     """Generates and pushes viewer counts periodically (push only)."""
-    global latest_viewers
     while True:
         now = datetime.now()
-        latest_viewers = generate_viewers_snapshot(now, _titles_from_now_playing())
+        _set_latest_viewers(_next_viewers(now))
+        _publish_viewers_state()
         _broadcast_to_subscribers(latest_viewers)  # push the raw array to SSE/Webhooks
         time.sleep(CONFIG["VIEWERS_INTERVAL_SEC"])
 
-# ------------ main ------------
-if __name__ == '__main__':
-    # Seed initial values so first requests aren’t empty
-    now_playing = get_current_or_next_today_slim()
+# ------------ multi-worker coordination ------------
+# One process (the leader) runs the schedulers, the SSE hub and webhooks;
+# the others serve /viewers and /subscribe from the snapshot it publishes.
+leader_lock = LeaderLock(os.path.join(STATE_DIR, "leader.lock"))
+viewers_file = JSONFile(os.path.join(STATE_DIR, "viewers.json"))
+now_playing_file = JSONFile(os.path.join(STATE_DIR, "now_playing.json"))
 
-    # seed viewer state and latest snapshot with timestamps
+def _set_now_playing(programs):
+    """Swap in the now-playing list; the leader also shares it with the followers."""
+    global now_playing
+    now_playing = programs
+    if leader_lock.held:
+        now_playing_file.write(programs)
+
+def _publish_viewers_state():
+    """Leader: share the snapshot plus the smoothing state a successor needs."""
+    values, stamps = _viewer_engine.state() if _viewer_engine else (_viewer_state, _viewer_state_ts)
+    viewers_file.write({
+        "tick": _viewers_body[1],
+        "viewers": latest_viewers,
+        "smoothing": {ch: [v, stamps[ch].isoformat()] for ch, v in values.items()},
+    })
+
+def _seed_viewers(state):
+    """Continue from the previous leader's state, or start from random baselines."""
+    if state:
+        for ch, (value, ts) in state["smoothing"].items():
+            _viewer_state[ch] = value
+            _viewer_state_ts[ch] = datetime.fromisoformat(ts)
+        _set_latest_viewers(state["viewers"], state["tick"])
+        return
     seed = []
     now = datetime.now()
     for filename in FILES:
@@ -563,12 +774,60 @@ if __name__ == '__main__':
         _viewer_state[ch] = float(base)
         _viewer_state_ts[ch] = now
         seed.append({"channel": ch, "viewers": str(base)})
-    latest_viewers = seed
+    _set_latest_viewers(seed)
+
+def _become_leader():
+    global _viewer_engine
+    # Seed initial values so first requests aren’t empty
+    _set_now_playing(get_current_or_next_today_slim())
+    if CONFIG["VIEWER_SEED"] is not None:
+        random.seed(CONFIG["VIEWER_SEED"])
+    _seed_viewers(viewers_file.read()[1])
+    if CONFIG["VIEWER_ENGINE"] == "numpy" and np is not None:
+        channels = [_channel_name_from_file(f) for f in FILES]
+        _viewer_engine = ViewerEngine(channels, CONFIG, HOUR_BANDS_V2, _popularity_factor,
+                                      seed=CONFIG["VIEWER_SEED"])
+        _viewer_engine.load_state(_viewer_state, _viewer_state_ts)
+
+    # SSE hub first so no viewer tick is published before it listens
+    sse_hub.keepalive_sec = CONFIG["SSE_KEEPALIVE_SEC"]
+    if SSE_PORT:
+        sse_hub.start()
+    webhooks.start()
 
     # Start both schedulers
     threading.Thread(target=scheduler_loop_programs, daemon=True).start()
     threading.Thread(target=scheduler_loop_viewers, daemon=True).start()
 
+def _follow_leader():
+    """Follower: mirror the leader's snapshots until the lock frees up."""
+    global now_playing
+    while not leader_lock.try_acquire():
+        changed, state = viewers_file.read()
+        if changed and state:
+            _set_latest_viewers(state["viewers"], state["tick"])
+            sse_hub.publish(state["viewers"])  # wakes this worker's /subscribe streams
+        changed, programs = now_playing_file.read()
+        if changed and programs is not None:
+            now_playing = programs
+        time.sleep(STATE_POLL_SEC)
+    print(f"Worker {os.getpid()} took over as leader")
+    _become_leader()
+
+def start_background():
+    """Run once per process: lead if nobody does, otherwise follow."""
+    if leader_lock.try_acquire():
+        print(f"Worker {os.getpid()} is the leader")
+        _become_leader()
+    else:
+        threading.Thread(target=_follow_leader, name="follow-leader", daemon=True).start()
+
+# ------------ main ------------
+if __name__ == '__main__':
+    # Development server: a single process, which becomes the leader
+    # (production: gunicorn -c gunicorn.conf.py flask_now_playing:app)
+    start_background()
+
     cert_file = os.getenv('SSL_CERT_FILE', 'cert.pem')
     key_file  = os.getenv('SSL_KEY_FILE', 'key.pem')
     ssl_ctx = None
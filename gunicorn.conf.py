@@ -0,0 +1,32 @@
+"""gunicorn settings for the API (multi-worker production mode).
+
+    gunicorn -c gunicorn.conf.py flask_now_playing:app
+
+Every worker serves the HTTP endpoints; one of them is elected leader and
+runs the viewer/now-playing schedulers, the SSE hub (SSE_PORT) and webhook
+delivery, sharing the results through STATE_DIR (see shared_state.py).
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# threads so a /subscribe fallback stream does not block a whole worker; at most
+# SUBSCRIBE_FALLBACK_MAX per worker, so keep GUNICORN_THREADS above it
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+timeout = 60
+graceful_timeout = 10
+accesslog = '-'
+
+_cert = os.getenv('SSL_CERT_FILE', 'cert.pem')
+_key = os.getenv('SSL_KEY_FILE', 'key.pem')
+if os.path.exists(_cert) and os.path.exists(_key):
+    certfile, keyfile = _cert, _key
+
+
+def post_worker_init(worker):
+    import flask_now_playing
+
+    flask_now_playing.app._ssl_enabled = 'certfile' in globals()
+    flask_now_playing.start_background()
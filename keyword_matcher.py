@@ -0,0 +1,90 @@
+"""Title keyword matching for the viewer popularity factor.
+
+All keywords are compiled once into an Aho–Corasick automaton, so a title
+is scanned in a single pass however many keywords there are (overlapping
+keywords such as "planet earth" and "earth" both match). Factors are
+memoised per title, since a channel's title only changes at program
+boundaries.
+
+Keyword tables can come from a JSON file (POPULARITY_KEYWORDS_FILE):
+
+    {"popular": {"premiere": 1.2, ...}, "unpopular": {"rerun": 0.88, ...}}
+"""
+import json
+from collections import deque
+from functools import lru_cache
+
+
+class AhoCorasick:
+    """Substring matcher for many patterns; iter(text) yields the values of all matches."""
+
+    def __init__(self, patterns):
+        goto = [{}]
+        out = [[]]
+        for pattern, value in patterns:
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    goto.append({})
+                    out.append([])
+                    nxt = goto[state][ch] = len(goto) - 1
+                state = nxt
+            out[state].append(value)
+
+        # failure links in BFS order, so a node's fallback is finished before it
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = [tuple(o) for o in out]
+
+    def iter(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            yield from out[state]
+
+
+class PopularityMatcher:
+    """factor(title): the highest popular multiplier (at least 1.0), capped by
+    the lowest unpopular one; keywords match case-insensitively anywhere."""
+
+    def __init__(self, popular, unpopular, cache_size=4096):
+        patterns = [(k.lower(), (True, m)) for k, m in popular.items() if k]
+        patterns += [(k.lower(), (False, m)) for k, m in unpopular.items() if k]
+        self._automaton = AhoCorasick(patterns)
+        self.factor = lru_cache(maxsize=cache_size)(self._factor)
+
+    def _factor(self, title):
+        if not title:
+            return 1.0
+        best = 1.0
+        lowest = None
+        for popular, m in self._automaton.iter(title.lower()):
+            if popular:
+                best = max(best, m)
+            elif lowest is None or m < lowest:
+                lowest = m
+        return best if lowest is None else min(best, lowest)
+
+
+def load_keyword_tables(path):
+    """{'popular': {...}, 'unpopular': {...}} with whichever sections the file has."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return {section: {k: float(m) for k, m in data[section].items()}
+            for section in ('popular', 'unpopular') if section in data}
@@ -1,14 +1,34 @@
+import fcntl
+import hashlib
+import os
 import re
-from datetime import datetime
+from contextlib import contextmanager
 from pathlib import Path
 import sqlite3
+import sys
 
-DB_PATH = "tvguide.db"
+import schedule_export
+from tv_format import iter_programs
+
+DB_PATH = os.getenv("DB_PATH", "tvguide.db")
+# Schedule rows older than this many days are pruned by apply_retention()
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", 14))
 INPUT_FILES = ["tv_programs_BBC.txt","tv_programs_Disc.txt","tv_programs_NatGeo.txt"]
-RECORD_SEP = re.compile(r"^-{3,}\s*$")
-KV_LINE     = re.compile(r"^\s*([^:]+)\s*:\s*(.*)\s*$")
+# "inplace": writers change DB_PATH directly. "snapshot": DB_PATH is a symlink to
+# a version file that is never written again; writers build the next version
+# from a copy and swap the link (see writable_db), so the file the API reads
+# never changes under it and a failed load never touches it. Every write pays
+# for a full copy (bench.py swap reports it); read latency is no better than
+# in place, where WAL readers do not wait on the writer either.
+DB_PUBLISH = os.getenv("DB_PUBLISH", "inplace")
+# Superseded versions kept next to the current one (readers may still use them)
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", 2))
+# Skip days whose records are unchanged since the last load and apply the
+# others as slot diffs (see load_rows_incremental); 0 upserts every record
+LOAD_INCREMENTAL = os.getenv("LOAD_INCREMENTAL", "1") == "1"
 
 DDL = """
+PRAGMA auto_vacuum=INCREMENTAL;
 PRAGMA journal_mode=WAL;
 PRAGMA foreign_keys=ON;
 
@@ -38,6 +58,24 @@ CREATE TABLE IF NOT EXISTS program_schedule (
   timestamp     TEXT DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY(program_id) REFERENCES program_info(id)
 );
+
+-- now-playing lookups: air_date = ? AND start_time/end_time range, then join
+-- on program_id (covering, so the range is answered from the index alone)
+CREATE INDEX IF NOT EXISTS idx_schedule_air_window
+  ON program_schedule(air_date, start_time, end_time, program_id);
+
+-- per-channel lookups and SELECT DISTINCT channel
+CREATE INDEX IF NOT EXISTS idx_info_channel
+  ON program_info(channel);
+
+-- content hash of each channel's day as last loaded (load_rows_incremental)
+CREATE TABLE IF NOT EXISTS schedule_fingerprint (
+  channel       TEXT NOT NULL,
+  air_date      TEXT NOT NULL,
+  fingerprint   TEXT NOT NULL,
+  loaded_at     TEXT DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (channel, air_date)
+);
 """
 
 
@@ -56,129 +94,469 @@ ON CONFLICT(title, channel) DO UPDATE SET
   duration_min=excluded.duration_min,
   link=excluded.link,
   genre=excluded.genre,
-  source_file=excluded.source_file;
-
-
+  source_file=excluded.source_file
+-- rows that would not change are left alone (no page writes)
+WHERE original_name IS NOT excluded.original_name
+   OR prod_year IS NOT excluded.prod_year
+   OR description IS NOT excluded.description
+   OR score_pct IS NOT excluded.score_pct
+   OR duration_min IS NOT excluded.duration_min
+   OR link IS NOT excluded.link
+   OR genre IS NOT excluded.genre
+   OR source_file IS NOT excluded.source_file;
 """
 
+# A slot is identified by (program_id, air_date, start_time); re-loading the
+# same listing updates it in place instead of appending a duplicate row.
 INSERT_SCHEDULE = """
 INSERT INTO program_schedule
   (program_id, day_name, air_date, start_time, end_time, viewer_count)
 VALUES
-  (?, ?, ?, ?, ?, NULL);
+  (?, ?, ?, ?, ?, NULL)
+ON CONFLICT(program_id, air_date, start_time) DO UPDATE SET
+  day_name=excluded.day_name,
+  end_time=excluded.end_time;
+"""
+
+SCHEDULE_SLOT_INDEX = "ux_schedule_slot"
+
+DAY_SLOTS = """
+SELECT ps.id, ps.program_id, ps.start_time, ps.day_name, ps.end_time
+FROM program_schedule ps
+JOIN program_info pi ON pi.id = ps.program_id
+WHERE ps.air_date = ? AND pi.channel = ?
+ORDER BY ps.id
+"""
+
+UPSERT_FINGERPRINT = """
+INSERT INTO schedule_fingerprint (channel, air_date, fingerprint)
+VALUES (?, ?, ?)
+ON CONFLICT(channel, air_date) DO UPDATE SET
+  fingerprint=excluded.fingerprint,
+  loaded_at=CURRENT_TIMESTAMP;
 """
 
+DELETE_FINGERPRINT = "DELETE FROM schedule_fingerprint WHERE channel=? AND air_date=?"
+
 
 def parse_file(path: Path):
-    items = []
-    with path.open("r", encoding="utf-8") as f:
-        block = []
-        for line in f:
-            if RECORD_SEP.match(line):
-                if block:
-                    rec = parse_block(block, path.name)
-                    if rec: items.append(rec)
-                    block = []
-            else:
-                if line.strip():
-                    block.append(line.rstrip("\n"))
-        if block:
-            rec = parse_block(block, path.name)
-            if rec: items.append(rec)
-    return items
-
-def parse_block(lines, source_file):
-    d = {}
-    for ln in lines:
-        m = KV_LINE.match(ln)
-        if m:
-            key, val = m.group(1).strip(), m.group(2).strip()
-            d[key] = val
+    """All records of one tv_programs_*.txt file as tv_format.Program tuples."""
+    return list(iter_programs(path))
 
-    def to_date_str(s):
-        if not s: return None
-        try:
-            return datetime.strptime(s, "%d.%m.%Y").strftime("%Y-%m-%d")
-        except ValueError:
-            return None
+def forget_fingerprints(conn, rows):
+    """Drop the stored fingerprints of the (channel, air_date) days in rows.
 
-    def to_time_str(s):
-        if not s: return None
-        try:
-            # normalize to HH:MM:SS
-            return datetime.strptime(s, "%H:%M").strftime("%H:%M:%S")
-        except ValueError:
-            return None
+    For loads that write days without diffing them: their slots no longer
+    match what the fingerprint describes, so the next incremental load must
+    diff those days instead of skipping them.
+    """
+    conn.executemany(DELETE_FINGERPRINT,
+                     {(row.channel, row.air_date) for row in rows
+                      if row.channel is not None and row.air_date is not None})
 
-    def first_int(s):
-        if not s: return None
-        m = re.search(r"\d+", s)
-        return int(m.group(0)) if m else None
+def load_rows_per_record(conn, rows):
+    """Reference loader: UPSERT + SELECT id + INSERT per record (kept for bench.py)."""
+    with conn:
+        forget_fingerprints(conn, rows)
+        for row in rows:
+            # Insert or update static info
+            conn.execute(UPSERT_INFO, row._asdict())
 
-    return {
-        "title":         d.get("Title") or None,
-        "day_name":      d.get("Day") or None,
-        "air_date":      to_date_str(d.get("Date")),           # TEXT
-        "start_time":    to_time_str(d.get("Start Time")),     # TEXT
-        "end_time":      to_time_str(d.get("End Time")),       # TEXT
-        "duration_min":  first_int(d.get("Duration")),
-        "channel":       d.get("Channel") or None,
-        "link":          d.get("Link") or None,
-        "original_name": d.get("Original Name") or None,
-        "prod_year":     first_int(d.get("Year")),
-        "description":   d.get("Description") or None,
-        "score_pct":     first_int(d.get("Score")),
-        "genre":         d.get("Genre") or None,
-        "source_file":   source_file,
-    }
+            # Get program_id
+            cur = conn.execute("""
+                SELECT id FROM program_info
+                WHERE title=? AND channel=?
+            """, (row.title, row.channel))
+
+
+            result = cur.fetchone()
+            if not result:
+                print(f"Missing program_id for {row.title}")
+                continue
+            program_id = result[0]
+
+            # Insert schedule
+            conn.execute(INSERT_SCHEDULE, (
+                program_id,
+                row.day_name,
+                row.air_date,
+                row.start_time,
+                row.end_time
+            ))
+
+def _upsert_programs(conn, rows):
+    """Upsert program_info for rows; returns {(title, channel): id}."""
+    # Repeated (title, channel) records would overwrite each other anyway: upsert
+    # each once, in first-seen order (same ids) with its last-seen values.
+    # NULL keys never conflict, so those rows all stay.
+    latest = {}
+    for row in rows:
+        key = (row.title, row.channel)
+        latest[key if None not in key else id(row)] = row
+    conn.executemany(UPSERT_INFO, (row._asdict() for row in latest.values()))
+
+    channels = sorted({row.channel for row in rows if row.channel is not None})
+    id_map = {}
+    if channels:
+        marks = ",".join("?" * len(channels))
+        for program_id, title, channel in conn.execute(
+            f"SELECT id, title, channel FROM program_info WHERE channel IN ({marks})",
+            channels,
+        ):
+            id_map[(title, channel)] = program_id
+    return id_map
+
+def load_rows(conn, rows):
+    """Bulk-load parsed records in one transaction; returns schedule rows upserted.
+
+    program_info is upserted with one executemany, ids are resolved with a
+    single query over the affected channels, and program_schedule is filled
+    with a second executemany.
+    """
+    if not rows:
+        return 0
+    with conn:
+        forget_fingerprints(conn, rows)
+        id_map = _upsert_programs(conn, rows)
+
+        schedule = []
+        for row in rows:
+            program_id = id_map.get((row.title, row.channel))
+            if program_id is None:
+                print(f"Missing program_id for {row.title}")
+                continue
+            schedule.append((
+                program_id,
+                row.day_name,
+                row.air_date,
+                row.start_time,
+                row.end_time
+            ))
+        conn.executemany(INSERT_SCHEDULE, schedule)
+    return len(schedule)
+
+def day_fingerprint(rows):
+    """Content hash of one channel's day: every field of every record, in order."""
+    h = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        h.update(repr(tuple(row)).encode("utf-8"))
+    return h.hexdigest()
+
+def load_rows_incremental(conn, rows, force=False):
+    """Apply parsed records as per-day diffs in one transaction; returns counts.
+
+    Records are grouped by (channel, air_date) and each day's fingerprint is
+    compared with the one stored by the previous load. When every day is
+    unchanged nothing is written; otherwise program_info is upserted as in
+    load_rows() and, for the changed days only, the slots that were added,
+    removed or changed are written to program_schedule. force=True diffs
+    every day. Records without a channel or date cannot be fingerprinted and
+    are upserted as load_rows() would.
+    """
+    days, loose = {}, []
+    for row in rows:
+        if row.channel is None or row.air_date is None:
+            loose.append(row)
+        else:
+            days.setdefault((row.channel, row.air_date), []).append(row)
+    stats = {"days": len(days), "days_skipped": 0, "added": 0, "updated": 0, "removed": 0,
+             "loose": 0}
+
+    fingerprints = {key: day_fingerprint(day_rows) for key, day_rows in days.items()}
+    if not force and days:
+        channels = sorted({channel for channel, _ in days})
+        marks = ",".join("?" * len(channels))
+        stored = dict(((channel, air_date), fp) for channel, air_date, fp in conn.execute(
+            f"SELECT channel, air_date, fingerprint FROM schedule_fingerprint WHERE channel IN ({marks})",
+            channels,
+        ))
+        days = {key: day_rows for key, day_rows in days.items()
+                if stored.get(key) != fingerprints[key]}
+    stats["days_skipped"] = stats["days"] - len(days)
+    if not days and not loose:
+        return stats
+
+    with conn:
+        # program_info is shared by every day a title airs on, so it is upserted
+        # from the whole listing like load_rows() does (unchanged rows cost no write)
+        id_map = _upsert_programs(conn, rows)
+        loose_slots = [(id_map[(row.title, row.channel)], row.day_name, row.air_date,
+                        row.start_time, row.end_time)
+                       for row in loose if (row.title, row.channel) in id_map]
+        conn.executemany(INSERT_SCHEDULE, loose_slots)
+        stats["loose"] = len(loose_slots)
+
+        for (channel, air_date), day_rows in days.items():
+            new = {}
+            for row in day_rows:
+                program_id = id_map.get((row.title, row.channel))
+                if program_id is None:
+                    print(f"Missing program_id for {row.title}")
+                    continue
+                new[(program_id, row.start_time)] = (row.day_name, row.end_time)
+
+            removed, updated, kept = [], [], set()
+            for slot_id, program_id, start_time, day_name, end_time in conn.execute(
+                DAY_SLOTS, (air_date, channel)
+            ):
+                key = (program_id, start_time)
+                if key not in new or key in kept:
+                    removed.append((slot_id,))
+                    continue
+                kept.add(key)
+                if new[key] != (day_name, end_time):
+                    updated.append((*new[key], slot_id))
+            added = [(program_id, day_name, air_date, start_time, end_time)
+                     for (program_id, start_time), (day_name, end_time) in new.items()
+                     if (program_id, start_time) not in kept]
+
+            conn.executemany("DELETE FROM program_schedule WHERE id=?", removed)
+            conn.executemany("UPDATE program_schedule SET day_name=?, end_time=? WHERE id=?", updated)
+            conn.executemany(INSERT_SCHEDULE, added)
+            stats["added"] += len(added)
+            stats["updated"] += len(updated)
+            stats["removed"] += len(removed)
 
-def main():
-    conn = sqlite3.connect(DB_PATH)
+        conn.executemany(UPSERT_FINGERPRINT,
+                         ((channel, air_date, fingerprints[(channel, air_date)])
+                          for channel, air_date in days))
+    return stats
+
+def load(conn, rows):
+    """load_rows_incremental() or, with LOAD_INCREMENTAL=0, load_rows(); returns counts."""
+    if not LOAD_INCREMENTAL:
+        return {"upserted": load_rows(conn, rows)}
+    return load_rows_incremental(conn, rows)
+
+def describe_load(stats):
+    """One-line summary of load() counts."""
+    if "upserted" in stats:
+        return f"{stats['upserted']} schedule rows upserted"
+    return (f"{stats['days'] - stats['days_skipped']} of {stats['days']} days changed: "
+            f"{stats['added']} slots added, {stats['updated']} updated, {stats['removed']} removed"
+            + (f", {stats['loose']} undated rows upserted" if stats["loose"] else ""))
+
+def migrate_schedule_slot_key(conn):
+    """One-off: drop duplicate schedule slots, then enforce the slot key.
+
+    Older databases appended every slot again on each load; the newest copy
+    of each (program_id, air_date, start_time) is kept. Returns rows removed.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name=?",
+        (SCHEDULE_SLOT_INDEX,)
+    ).fetchone()
+    if exists:
+        return 0
+    with conn:
+        cur = conn.execute("""
+            DELETE FROM program_schedule
+            WHERE air_date IS NOT NULL AND start_time IS NOT NULL
+              AND id NOT IN (
+                SELECT MAX(id) FROM program_schedule
+                WHERE air_date IS NOT NULL AND start_time IS NOT NULL
+                GROUP BY program_id, air_date, start_time
+              )
+        """)
+        conn.execute(f"""
+            CREATE UNIQUE INDEX {SCHEDULE_SLOT_INDEX}
+            ON program_schedule(program_id, air_date, start_time)
+        """)
+    if cur.rowcount:
+        print(f"Removed {cur.rowcount} duplicate schedule rows.")
+    return cur.rowcount
+
+def init_db(conn):
     conn.execute("PRAGMA synchronous=NORMAL;")
     for stmt in filter(None, DDL.split(";")):
         s = stmt.strip()
         if s: conn.execute(s + ";")
+    migrate_schedule_slot_key(conn)
+
+def _db_bytes(db_path):
+    """Size of the database plus its WAL file."""
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+def apply_retention(conn, db_path=None, horizon_days=RETENTION_DAYS):
+    """Prune old schedule rows and orphaned programs, then give the space back.
+
+    Switches the database to incremental auto-vacuum on first use (one full
+    VACUUM), so later runs only need PRAGMA incremental_vacuum. Ends with a
+    TRUNCATE checkpoint so the WAL file does not keep the freed pages either.
+    db_path (for the size figures) defaults to the connection's own file.
+    """
+    if db_path is None:
+        db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    bytes_before = _db_bytes(db_path)
+    with conn:
+        schedule_deleted = conn.execute("""
+            DELETE FROM program_schedule
+            WHERE air_date < date('now', 'localtime', ?)
+        """, (f"-{horizon_days} days",)).rowcount
+        programs_deleted = conn.execute("""
+            DELETE FROM program_info
+            WHERE id NOT IN (
+              SELECT program_id FROM program_schedule WHERE program_id IS NOT NULL
+            )
+        """).rowcount
+        conn.execute("""
+            DELETE FROM schedule_fingerprint
+            WHERE air_date < date('now', 'localtime', ?)
+        """, (f"-{horizon_days} days",))
+
+    if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:  # 2 = INCREMENTAL
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        conn.execute("VACUUM;")
+    else:
+        conn.execute("PRAGMA incremental_vacuum;").fetchall()
+    busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE);").fetchone()
+
+    return {
+        "schedule_deleted": schedule_deleted,
+        "programs_deleted": programs_deleted,
+        "bytes_before": bytes_before,
+        "bytes_after": _db_bytes(db_path),
+        "checkpoint_busy": bool(busy),
+    }
+
+# ------------------ snapshot publishing ------------------
+def snapshot_versions(db_path):
+    """Published version files of db_path (<db>.v<N>), oldest first."""
+    folder, base = os.path.split(os.path.abspath(db_path))
+    pattern = re.compile(re.escape(base) + r"\.v(\d+)$")
+    found = []
+    for name in os.listdir(folder):
+        m = pattern.match(name)
+        if m:
+            found.append((int(m.group(1)), os.path.join(folder, name)))
+    return [path for _, path in sorted(found)]
+
+def _remove_db_files(path):
+    for p in (path, path + "-wal", path + "-shm", path + "-journal"):
+        if os.path.exists(p):
+            os.remove(p)
+
+def begin_snapshot(db_path, staging):
+    """Copy of the current version of db_path (empty if none) at staging, schema applied."""
+    _remove_db_files(staging)
+    conn = sqlite3.connect(staging)
+    if os.path.exists(db_path):
+        src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            src.backup(conn)
+        finally:
+            src.close()
+    init_db(conn)
+    return conn
+
+def publish_snapshot(conn, staging, db_path):
+    """Make staging the current version of db_path; returns the version file.
 
-    for fname in INPUT_FILES:
+    The copy is switched to a rollback journal so the version is one
+    self-contained file, renamed to <db>.v<N>, and db_path is re-pointed by
+    renaming a new symlink over it (atomic). Connections already open on an
+    older version keep reading it; versions beyond SNAPSHOT_KEEP are unlinked.
+    The first publish replaces an in-place database file; its -wal/-shm are
+    left where they are, as readers still on that file may be using them.
+    """
+    conn.execute("PRAGMA journal_mode=DELETE;")
+    conn.close()
+    with open(staging, "rb") as f:
+        os.fsync(f.fileno())
+
+    versions = snapshot_versions(db_path)
+    n = int(versions[-1].rsplit(".v", 1)[1]) + 1 if versions else 1
+    version = f"{os.path.abspath(db_path)}.v{n}"
+    os.rename(staging, version)
+
+    link = db_path + ".link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, db_path)
+    folder = os.open(os.path.dirname(os.path.abspath(db_path)), os.O_RDONLY)
+    try:
+        os.fsync(folder)
+    finally:
+        os.close(folder)
+
+    for old in snapshot_versions(db_path)[:-(SNAPSHOT_KEEP + 1)]:
+        os.remove(old)
+    return version
+
+@contextmanager
+def writable_db(db_path=DB_PATH, publish=None):
+    """Connection for changing db_path, with the schema applied.
+
+    publish="inplace" (default DB_PUBLISH) writes db_path itself. With
+    "snapshot" the connection is to a staging copy, published as the next
+    version when the block exits cleanly and dropped if it raises; snapshot
+    writers are serialised by a lock file next to the database. Pending
+    changes are committed on a clean exit in both modes; a snapshot without
+    any row changes is not published.
+    """
+    if (publish or DB_PUBLISH) != "snapshot":
+        conn = sqlite3.connect(db_path)
+        try:
+            init_db(conn)
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+        return
+
+    staging = db_path + ".staging"
+    with open(db_path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        conn = begin_snapshot(db_path, staging)
+        changes = conn.total_changes
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            _remove_db_files(staging)
+            raise
+        conn.commit()
+        if conn.total_changes == changes:  # nothing to publish
+            conn.close()
+            _remove_db_files(staging)
+            return
+        publish_snapshot(conn, staging, db_path)
+
+def export_parquet(db_path=DB_PATH):
+    """Write the Parquet snapshot when SCHEDULE_EXPORT=1 (see schedule_export.py)."""
+    if not schedule_export.SCHEDULE_EXPORT:
+        return
+    out_dir = schedule_export.default_export_dir(db_path)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        n = schedule_export.export_schedule(conn, out_dir)
+        print(f"Parquet snapshot: {n} rows in {out_dir}")
+    except ImportError as e:
+        print(f"WARNING: SCHEDULE_EXPORT=1 but {e}; skipping export.")
+    finally:
+        conn.close()
+
+def main(argv=None):
+    # python load_tv_programs_sqlite.py [FILE ...]   (default: INPUT_FILES)
+    files = (sys.argv[1:] if argv is None else argv) or INPUT_FILES
+
+    rows = []
+    for fname in files:
         p = Path(fname)
         if not p.exists():
             print(f"WARNING: {fname} not found, skipping.")
             continue
+        rows.extend(parse_file(p))
 
-        rows = parse_file(p)
-        if not rows:
-            continue
-
-        with conn:
-            for row in rows:
-                # Insert or update static info
-                conn.execute(UPSERT_INFO, row)
-
-                # Get program_id
-                cur = conn.execute("""
-                    SELECT id FROM program_info
-                    WHERE title=? AND channel=?
-                """, (row["title"], row["channel"]))
+    # One transaction for every file (and one new version in snapshot mode)
+    with writable_db(DB_PATH) as conn:
+        stats = load(conn, rows)
 
+    print(f"Data loaded into {DB_PATH}: {describe_load(stats)}.")
 
-                result = cur.fetchone()
-                if not result:
-                    print(f"Missing program_id for {row['title']}")
-                    continue
-                program_id = result[0]
-
-                # Insert schedule
-                conn.execute(INSERT_SCHEDULE, (
-                    program_id,
-                    row["day_name"],
-                    row["air_date"],
-                    row["start_time"],
-                    row["end_time"]
-                ))
-
-    print(f"Data inserted into {DB_PATH}.")
-    conn.close()
+    export_parquet(DB_PATH)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
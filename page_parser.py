@@ -0,0 +1,200 @@
+"""HTML extraction for tv-program.sk listing and detail pages.
+
+Backends, fastest first: selectolax, lxml (BeautifulSoup), html.parser
+(BeautifulSoup). The first installed one is used unless HTML_PARSER names
+another. The BeautifulSoup backends only build the subtrees we query
+(SoupStrainer), so navigation, ads and footers are never turned into Tags.
+"""
+import os
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:  # optional dependency; selectolax < 0.3 only ships Modest
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+try:
+    import lxml  # noqa: F401  (only needed as a BeautifulSoup feature)
+except ImportError:
+    lxml = None
+
+BACKENDS = ('selectolax', 'lxml', 'html.parser')
+
+LABEL_ORIGINAL_NAME = 'Pôvodný názov:'
+LABEL_YEAR = 'Rok výroby:'
+
+
+def available_backends():
+    installed = {'selectolax': HTMLParser is not None, 'lxml': lxml is not None,
+                 'html.parser': True}
+    return [b for b in BACKENDS if installed[b]]
+
+
+def default_backend():
+    wanted = os.getenv('HTML_PARSER')
+    available = available_backends()
+    if wanted:
+        if wanted not in available:
+            raise ValueError(f"HTML_PARSER={wanted!r} is not available; have {available}")
+        return wanted
+    return available[0]
+
+
+# ------------------ selective BeautifulSoup parsing ------------------
+class _KeepTags(SoupStrainer):
+    """Keep top-level tags named in ``names`` or carrying one of ``classes``.
+
+    A matching tag is kept with its whole subtree; everything outside the
+    matches (and stray top-level text) is discarded while parsing.
+    """
+
+    def __init__(self, names=(), classes=()):
+        # A name rule makes SoupStrainer drop top-level strings; the actual
+        # tag decision is made in _keep().
+        super().__init__(name=lambda *_: True)
+        self.names = frozenset(names)
+        self.classes = frozenset(classes)
+
+    def _keep(self, name, attrs):
+        if name in self.names:
+            return True
+        cls = (attrs or {}).get('class')
+        if isinstance(cls, str):
+            cls = cls.split()
+        return bool(cls) and not self.classes.isdisjoint(cls)
+
+    def search_tag(self, markup_name=None, markup_attrs={}):  # bs4 < 4.13
+        return markup_name if self._keep(markup_name, markup_attrs) else None
+
+    def allow_tag_creation(self, nsprefix, name, attrs):  # bs4 >= 4.13
+        return self._keep(name, attrs)
+
+
+LISTING_STRAINER = _KeepTags(classes=('page__title-name', 'programme-list'))
+# strong/span for the labeled fields: the value is the next <span> after the label
+DETAIL_STRAINER = _KeepTags(names=('strong', 'span'),
+                            classes=('post__body', 'bg-warning', 'tagy'))
+
+
+def _soup(html, backend, strainer):
+    return BeautifulSoup(html, 'lxml' if backend == 'lxml' else 'html.parser',
+                         parse_only=strainer)
+
+
+def _bs4_listing(html, backend):
+    soup = _soup(html, backend, LISTING_STRAINER)
+    channel_tag = soup.select_one('.page__title-name')
+    channel_name = channel_tag.text.strip() if channel_tag else 'Unknown'
+
+    days = []
+    for day_block in soup.select('.programme-list'):
+        day_tag = day_block.select_one('.programme-list__header .col-auto.h4')
+        day_name = day_tag.text.strip() if day_tag else 'Unknown'
+        items = []
+        for item in day_block.select('.programme-list__item'):
+            time_tag = item.select_one('time.programme-list__time')
+            title_tag = item.select_one('a.programme-list__title')
+            items.append((
+                time_tag.text.strip() if time_tag else None,
+                title_tag.text.strip() if title_tag else None,
+                title_tag.get('href') if title_tag else None,
+            ))
+        days.append((day_name, items))
+    return channel_name, days
+
+
+def _bs4_details(html, backend):
+    soup = _soup(html, backend, DETAIL_STRAINER)
+
+    def get_text(sel, default=''):
+        tag = soup.select_one(sel)
+        return tag.text.strip() if tag else default
+
+    # labeled fields
+    def labeled_value(label):
+        tag = soup.find('strong', string=label)
+        return tag.find_next('span').text.strip() if tag else ''
+
+    return {
+        'Original Name': labeled_value(LABEL_ORIGINAL_NAME),
+        'Year':          labeled_value(LABEL_YEAR),
+        'Description':   get_text('.post__body p', ''),
+        'Score':         get_text('.bg-warning .h3', ''),
+        'Genre':         get_text('.tagy', ''),
+    }
+
+
+# ------------------ selectolax ------------------
+def _text(node):
+    return node.text().strip() if node is not None else None
+
+
+def _sx_listing(html):
+    tree = HTMLParser(html)
+    channel_name = _text(tree.css_first('.page__title-name')) or 'Unknown'
+
+    days = []
+    for day_block in tree.css('.programme-list'):
+        day_name = _text(day_block.css_first('.programme-list__header .col-auto.h4'))
+        items = []
+        for item in day_block.css('.programme-list__item'):
+            title_tag = item.css_first('a.programme-list__title')
+            items.append((
+                _text(item.css_first('time.programme-list__time')),
+                _text(title_tag),
+                title_tag.attributes.get('href') if title_tag is not None else None,
+            ))
+        days.append((day_name if day_name is not None else 'Unknown', items))
+    return channel_name, days
+
+
+def _sx_details(html):
+    tree = HTMLParser(html)
+
+    def get_text(sel, default=''):
+        node = tree.css_first(sel)
+        return _text(node) if node is not None else default
+
+    # strong/span in document order, so "next span after the label" is a scan
+    labeled = {}
+    pending = None
+    for node in tree.css('strong, span'):
+        if node.tag == 'strong':
+            text = node.text()
+            if text in (LABEL_ORIGINAL_NAME, LABEL_YEAR) and text not in labeled:
+                pending = pending or []
+                pending.append(text)
+        elif pending:
+            value = _text(node)
+            for label in pending:
+                labeled[label] = value
+            pending = None
+
+    return {
+        'Original Name': labeled.get(LABEL_ORIGINAL_NAME, ''),
+        'Year':          labeled.get(LABEL_YEAR, ''),
+        'Description':   get_text('.post__body p', ''),
+        'Score':         get_text('.bg-warning .h3', ''),
+        'Genre':         get_text('.tagy', ''),
+    }
+
+
+# ------------------ public API ------------------
+def parse_listing(html, backend=None):
+    """Return (channel_name, [(day_name, [(start_time, title, link), ...]), ...])."""
+    backend = backend or default_backend()
+    if backend == 'selectolax':
+        return _sx_listing(html)
+    return _bs4_listing(html, backend)
+
+
+def parse_details(html, backend=None):
+    """Return the detail fields of a /program/... page."""
+    backend = backend or default_backend()
+    if backend == 'selectolax':
+        return _sx_details(html)
+    return _bs4_details(html, backend)
@@ -0,0 +1,202 @@
+"""Columnar (Parquet) snapshot of the schedule for analytics.
+
+    python schedule_export.py export [DB] [OUT]          # write a snapshot
+    python schedule_export.py query OUT [--channel C ...] [--from D] [--to D]
+                                        [--columns title genre ...]
+
+The snapshot is the program_schedule ⨝ program_info join, hive-partitioned as
+OUT/channel=<name>/air_date=<YYYY-MM-DD>/*.parquet, with channel and genre
+dictionary-encoded. Analysts read it with read_schedule() (or any Arrow/
+Parquet reader) instead of querying tvguide.db next to the API. Each
+snapshot is written to its own OUT.v<N> directory and OUT is a symlink that
+is re-pointed at it atomically, so OUT always names a complete snapshot.
+Readers should resolve OUT once (os.path.realpath, as read_schedule does)
+before listing files; the EXPORT_KEEP previous versions stay on disk for
+readers that are still on them.
+
+The loader writes one after each load when SCHEDULE_EXPORT=1 (the scheduler
+once per cycle, after every channel is loaded). pyarrow is optional: without
+it, export is skipped with a warning.
+"""
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import sys
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # optional dependency
+    pa = ds = None
+
+SCHEDULE_EXPORT = os.getenv("SCHEDULE_EXPORT", "0") == "1"
+# Previous snapshot versions kept next to the current one
+EXPORT_KEEP = int(os.getenv("EXPORT_KEEP", 2))
+
+EXPORT_SQL = """
+    SELECT pi.channel, ps.air_date, ps.day_name, ps.start_time, ps.end_time,
+           pi.title, pi.original_name, pi.prod_year, pi.genre, pi.score_pct,
+           pi.duration_min, pi.description, pi.link, ps.program_id
+    FROM program_schedule ps
+    JOIN program_info pi ON pi.id = ps.program_id
+    WHERE pi.channel IS NOT NULL AND ps.air_date IS NOT NULL
+    ORDER BY pi.channel, ps.air_date, ps.start_time
+"""
+
+
+def default_export_dir(db_path):
+    """<dir of DB>/schedule_parquet, i.e. next to the SQLite file."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "schedule_parquet")
+
+
+def export_versions(out_dir):
+    """Published snapshot directories of out_dir (<out_dir>.v<N>), oldest first."""
+    folder, base = os.path.split(os.path.abspath(out_dir))
+    pattern = re.compile(re.escape(base) + r"\.v(\d+)$")
+    found = []
+    for name in os.listdir(folder):
+        m = pattern.match(name)
+        if m:
+            found.append((int(m.group(1)), os.path.join(folder, name)))
+    return [path for _, path in sorted(found)]
+
+
+def _publish(staging, out_dir):
+    """Rename staging to the next <out_dir>.v<N> and re-point the out_dir symlink at it."""
+    versions = export_versions(out_dir)
+    n = int(versions[-1].rsplit(".v", 1)[1]) + 1 if versions else 1
+    version = f"{out_dir}.v{n}"
+    os.rename(staging, version)
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # a plain directory from before versioned exports: moved aside once
+        os.rename(out_dir, f"{out_dir}.v0")
+    link = out_dir + ".link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, out_dir)
+    for old in export_versions(out_dir)[:-(EXPORT_KEEP + 1)]:
+        shutil.rmtree(old, ignore_errors=True)
+    return version
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("schedule_export needs pyarrow (pip install pyarrow)")
+
+
+def _schema():
+    text = pa.string()
+    return pa.schema([
+        ("channel", pa.dictionary(pa.int32(), text)),
+        ("air_date", text),
+        ("day_name", pa.dictionary(pa.int8(), text)),
+        ("start_time", text),
+        ("end_time", text),
+        ("title", text),
+        ("original_name", text),
+        ("prod_year", pa.int32()),
+        ("genre", pa.dictionary(pa.int32(), text)),
+        ("score_pct", pa.int32()),
+        ("duration_min", pa.int32()),
+        ("description", text),
+        ("link", text),
+        ("program_id", pa.int64()),
+    ])
+
+
+def _partitioning(read=False):
+    if read:  # channel comes back dictionary-encoded, like genre inside the files
+        return ds.partitioning(pa.schema([("channel", pa.dictionary(pa.int32(), pa.string())),
+                                          ("air_date", pa.string())]),
+                               flavor="hive", dictionaries="infer")
+    return ds.partitioning(pa.schema([("channel", pa.string()), ("air_date", pa.string())]),
+                           flavor="hive")
+
+
+def export_schedule(conn, out_dir):
+    """Write the current schedule to out_dir; returns the number of rows."""
+    _require_pyarrow()
+    schema = _schema()
+    rows = conn.execute(EXPORT_SQL).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    table = pa.Table.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+    out_dir = os.path.abspath(out_dir)
+    staging = out_dir + ".new"
+    shutil.rmtree(staging, ignore_errors=True)
+    ds.write_dataset(table, staging, format="parquet", partitioning=_partitioning(),
+                     basename_template="part-{i}.parquet")
+    os.makedirs(staging, exist_ok=True)  # an empty schedule writes no files
+    _publish(staging, out_dir)
+    return table.num_rows
+
+
+def read_schedule(root, columns=None, channels=None, date_from=None, date_to=None):
+    """Read a snapshot as a pyarrow Table, opening only the partitions that match.
+
+    columns: names to load (partition keys included), None for all.
+    channels: iterable of channel names; date_from/date_to: inclusive ISO dates.
+    """
+    _require_pyarrow()
+    # resolve the symlink once, so every file comes from the same snapshot
+    dataset = ds.dataset(os.path.realpath(root), format="parquet",
+                         partitioning=_partitioning(read=True))
+    cond = None
+    for expr in (
+        ds.field("channel").isin(list(channels)) if channels else None,
+        ds.field("air_date") >= date_from if date_from else None,
+        ds.field("air_date") <= date_to if date_to else None,
+    ):
+        if expr is not None:
+            cond = expr if cond is None else cond & expr
+    return dataset.to_table(columns=columns, filter=cond)
+
+
+# ------------------ CLI ------------------
+def _cmd_export(args):
+    db_path = args.db or os.getenv("DB_PATH", "tvguide.db")
+    out_dir = args.out or default_export_dir(db_path)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    n = export_schedule(conn, out_dir)
+    conn.close()
+    print(f"Exported {n} schedule rows to {out_dir}")
+
+
+def _cmd_query(args):
+    table = read_schedule(args.root, columns=args.columns, channels=args.channel,
+                          date_from=args.date_from, date_to=args.date_to)
+    print(f"{table.num_rows} rows, columns: {', '.join(table.column_names)}")
+    print(table.slice(0, args.limit).to_pylist() if args.limit else "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="write a Parquet snapshot of the schedule")
+    p.add_argument("db", nargs="?")
+    p.add_argument("out", nargs="?")
+    p.set_defaults(func=_cmd_export)
+
+    p = sub.add_parser("query", help="read columns/partitions of a snapshot")
+    p.add_argument("root")
+    p.add_argument("--columns", nargs="+")
+    p.add_argument("--channel", action="append")
+    p.add_argument("--from", dest="date_from")
+    p.add_argument("--to", dest="date_to")
+    p.add_argument("--limit", type=int, default=5)
+    p.set_defaults(func=_cmd_query)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
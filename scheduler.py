@@ -4,9 +4,15 @@ import subprocess
 import logging
 import os
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 
+import load_tv_programs_sqlite as loader
+import scraper
+
 # Setup logging with better formatting
 log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
 logging.basicConfig(
@@ -22,108 +28,298 @@ logger = logging.getLogger(__name__)
 # Configuration from environment
 SCRAPING_INTERVAL = int(os.getenv('SCRAPING_INTERVAL_HOURS', 6))
 DB_PATH = os.getenv('DB_PATH', '/app/data/tvguide.db')
+# Subprocesses (scraper, loader) must use the same database as the API
+CHILD_ENV = {**os.environ, 'DB_PATH': DB_PATH}
+SCRAPERS = ['BBC', 'Disc', 'NatGeo']
+# Channel scrapes running at once (1 = one after another)
+SCRAPE_PARALLELISM = max(1, int(os.getenv('SCRAPE_PARALLELISM', 3)))
+DETAIL_RPS = float(os.getenv('DETAIL_RPS', 2.0))
+# "subprocess": scraper.py and the loader run as child processes, via the txt files.
+# "inprocess": both are called as functions and records go straight to the loader;
+# the txt files are then only written with PIPELINE_WRITE_TXT=1.
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'subprocess')
+PIPELINE_WRITE_TXT = os.getenv('PIPELINE_WRITE_TXT', '0') == '1'
+# With DB_PUBLISH=snapshot every write copies the whole database, so the loads wait
+# for the end of the cycle and go in as one write: one copy and one published version
+# (in-process mode also applies retention in it; subprocess mode runs one loader)
+DEFER_LOADS = loader.DB_PUBLISH == 'snapshot'
+
+_load_lock = threading.Lock()
+_status_lock = threading.Lock()
 
-def create_status_file(status, message=""):
-    """Create a status file for health checks"""
+def create_status_file(status, message="", **extra):
+    """Create a status file for health checks (extra keys, e.g. stage timings, are added)"""
     status_data = {
         "status": status,
         "timestamp": datetime.now().isoformat(),
-        "message": message
+        "message": message,
+        **extra
     }
     
     status_file = Path('/app/data/scheduler_status.json')
-    with open(status_file, 'w') as f:
+    with _status_lock, open(status_file, 'w') as f:
         json.dump(status_data, f, indent=2)
 
 def run_scraper(scraper_name):
-    """Run a specific scraper with better error handling"""
+    """Scrape one channel in its own scraper.py process; returns True if it exited cleanly
+    and its output file exists (an unchanged listing leaves the previous file in place)"""
+    # The site's detail-page budget is shared by the scrapes running side by side
+    share = max(1, min(SCRAPE_PARALLELISM, len(SCRAPERS)))
+    env = {**CHILD_ENV, 'DETAIL_RPS': str(DETAIL_RPS / share)}
+    succeeded = False
     try:
         logger.info(f"Starting {scraper_name} scraper...")
         
         result = subprocess.run(
-            ['python', f'scraper_{scraper_name}.py'], 
+            ['python', 'scraper.py', scraper_name], 
             capture_output=True, 
             text=True, 
             timeout=3600,
-            cwd='/app'
+            cwd='/app',
+            env=env
         )
         
-        if result.returncode == 0:
-            logger.info(f"{scraper_name} scraper completed successfully")
-            
-            # Check if output file was created
-            output_file = f'tv_programs_{scraper_name}.txt'
-            if os.path.exists(output_file):
-                file_size = os.path.getsize(output_file)
-                logger.info(f"{scraper_name} output file size: {file_size} bytes")
-            else:
-                logger.warning(f"{scraper_name} output file not found")
-                
-            return True
-        else:
-            logger.error(f"{scraper_name} scraper failed with code {result.returncode}")
+        if result.returncode != 0:
+            logger.error(f"{scraper_name} scraper exited with code {result.returncode}")
             logger.error(f"Stderr: {result.stderr}")
-            return False
+        else:
+            succeeded = True
             
     except subprocess.TimeoutExpired:
         logger.error(f"{scraper_name} scraper timed out after 1 hour")
-        return False
     except Exception as e:
         logger.error(f"Unexpected error running {scraper_name} scraper: {e}")
+    
+    # An unchanged listing leaves the output file as it was (not rewritten)
+    output_file = f'tv_programs_{scraper_name}.txt'
+    if succeeded and os.path.exists(output_file):
+        file_size = os.path.getsize(output_file)
+        logger.info(f"{scraper_name} scraper completed successfully")
+        logger.info(f"{scraper_name} output file size: {file_size} bytes")
+        return True
+    logger.warning(f"{scraper_name} output file not updated")
+    return False
+
+def load_channel(*scraper_names):
+    """Load the channels' output files into the database in one loader run; returns True on success"""
+    label = ", ".join(scraper_names)
+    result = subprocess.run(
+        ['python', 'load_tv_programs_sqlite.py', *(f'tv_programs_{name}.txt' for name in scraper_names)], 
+        capture_output=True, 
+        text=True, 
+        timeout=300,
+        cwd='/app',
+        # run_all_scrapers exports once after all channels are loaded
+        env={**CHILD_ENV, 'SCHEDULE_EXPORT': '0'}
+    )
+    if result.returncode != 0:
+        logger.error(f"{label} database update failed: {result.stderr}")
         return False
+    logger.info(f"{label}: {result.stdout.strip()}")
+    return True
+
+def scrape_and_load(scraper_name):
+    """Scrape a channel, then load it as soon as the database is free; returns its stage timings"""
+    stage = {"scraped": False, "loaded": False}
+    t0 = time.monotonic()
+    stage["scraped"] = run_scraper(scraper_name)
+    stage["scrape_sec"] = round(time.monotonic() - t0, 3)
+    if not stage["scraped"] or DEFER_LOADS:
+        return stage
+    
+    # SQLite takes one writer at a time: loads queue here while other scrapes keep running
+    t0 = time.monotonic()
+    with _load_lock:
+        stage["load_wait_sec"] = round(time.monotonic() - t0, 3)
+        t0 = time.monotonic()
+        try:
+            stage["loaded"] = load_channel(scraper_name)
+        except Exception as e:
+            logger.error(f"{scraper_name} database update failed: {e}")
+        stage["load_sec"] = round(time.monotonic() - t0, 3)
+    return stage
+
+def scrape_and_load_inprocess(run, scraper_name, deferred=None):
+    """In-process scrape_and_load(): records go from the scraper to load_rows() directly
+    (or, when a deferred list is given, are appended to it for load_deferred())"""
+    stage = {"scraped": False, "loaded": False}
+    channel = scraper.CHANNELS[scraper_name]
+    t0 = time.monotonic()
+    try:
+        logger.info(f"Starting {scraper_name} scraper...")
+        programs, validators = run.scrape(scraper_name, output=PIPELINE_WRITE_TXT)
+        stage["scraped"] = True
+        if programs is None:
+            # nothing new since the last listing that made it into the database
+            logger.info(f"{scraper_name} listing unchanged, nothing to load")
+            stage["unchanged"] = True
+        else:
+            rows = list(scraper.program_records(programs, channel.output))
+            logger.info(f"{scraper_name} scraper completed: {len(rows)} programs")
+    except Exception as e:
+        logger.error(f"{scraper_name} scraper failed: {e}")
+    stage["scrape_sec"] = round(time.monotonic() - t0, 3)
+    if not stage["scraped"] or stage.get("unchanged"):
+        return stage
+    if deferred is not None:
+        deferred.append((scraper_name, rows, validators))
+        return stage
+    
+    t0 = time.monotonic()
+    with _load_lock:
+        stage["load_wait_sec"] = round(time.monotonic() - t0, 3)
+        t0 = time.monotonic()
+        try:
+            with loader.writable_db(DB_PATH) as conn:
+                stage["rows"] = loader.load(conn, rows)
+            stage["loaded"] = True
+            logger.info(f"{scraper_name}: {loader.describe_load(stage['rows'])}")
+            # only a committed load lets the next cycle skip this listing
+            run.save_listing(validators)
+        except Exception as e:
+            logger.error(f"{scraper_name} database update failed: {e}")
+        stage["load_sec"] = round(time.monotonic() - t0, 3)
+    return stage
+
+def load_deferred(run, deferred, stages):
+    """Load the cycle's deferred channels, then apply retention, in one writable_db();
+    listing validators are saved once that write is published"""
+    t0 = time.monotonic()
+    saved = []
+    try:
+        with loader.writable_db(DB_PATH) as conn:
+            for scraper_name, rows, validators in deferred:
+                stage = stages[scraper_name]
+                t1 = time.monotonic()
+                try:
+                    stage["rows"] = loader.load(conn, rows)
+                    conn.commit()
+                    stage["loaded"] = True
+                    saved.append(validators)
+                    logger.info(f"{scraper_name}: {loader.describe_load(stage['rows'])}")
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"{scraper_name} database update failed: {e}")
+                stage["load_sec"] = round(time.monotonic() - t1, 3)
+            if saved:
+                t1 = time.monotonic()
+                run_retention(conn)
+                stages["retention"] = {"sec": round(time.monotonic() - t1, 3)}
+    except Exception as e:
+        logger.error(f"Database update failed: {e}")
+        for scraper_name, _, _ in deferred:
+            stages[scraper_name]["loaded"] = False
+        return
+    for validators in saved:
+        run.save_listing(validators)
+    logger.info(f"Loaded {len(saved)}/{len(deferred)} channels in one write in "
+                f"{time.monotonic() - t0:.1f} seconds")
+
+def run_retention(conn=None):
+    """Prune old schedule rows/orphaned programs and reclaim space (in conn if given,
+    else in a writable_db() of its own)"""
+    try:
+        if conn is None:
+            with loader.writable_db(DB_PATH) as conn:
+                stats = loader.apply_retention(conn)
+        else:
+            stats = loader.apply_retention(conn)
+        reclaimed = stats["bytes_before"] - stats["bytes_after"]
+        logger.info(
+            f"Retention ({loader.RETENTION_DAYS} days): pruned {stats['schedule_deleted']} schedule rows "
+            f"and {stats['programs_deleted']} orphaned programs, reclaimed {reclaimed} bytes "
+            f"({stats['bytes_before']} -> {stats['bytes_after']})"
+        )
+        if stats["checkpoint_busy"]:
+            logger.warning("WAL checkpoint could not complete (readers busy); will retry next run")
+    except Exception as e:
+        logger.error(f"Retention failed: {e}")
 
 def run_all_scrapers():
-    """Run all scrapers and update database with comprehensive logging"""
+    """Scrape all channels concurrently, loading each one as soon as it finishes"""
     start_time = datetime.now()
     logger.info("=== Starting scheduled scraping job ===")
     
-    create_status_file("running", "Scraping in progress")
+    stages = {}
+    create_status_file("running", "Scraping in progress", stages=stages)
     
+    run = None
+    deferred = [] if DEFER_LOADS else None
     try:
-        # Run all scrapers
-        scrapers = ['BBC', 'Disc', 'NatGeo']
-        success_count = 0
+        if PIPELINE_MODE == 'inprocess':
+            run = scraper.ScrapeRun()
+            task = partial(scrape_and_load_inprocess, run, deferred=deferred)
+        else:
+            task = scrape_and_load
+        
+        with ThreadPoolExecutor(max_workers=SCRAPE_PARALLELISM) as pool:
+            futures = {pool.submit(task, name): name for name in SCRAPERS}
+            for future in as_completed(futures):
+                name = futures[future]
+                stages[name] = future.result()
+                create_status_file("running", f"{len(stages)}/{len(SCRAPERS)} channels done",
+                                   stages=stages)
+        
+        if deferred:
+            load_deferred(run, deferred, stages)
+        elif DEFER_LOADS and PIPELINE_MODE != 'inprocess':
+            scraped = [name for name in SCRAPERS if stages[name]["scraped"]]
+            if scraped:
+                t0 = time.monotonic()
+                loaded = load_channel(*scraped)
+                for name in scraped:
+                    stages[name]["loaded"] = loaded
+                stages["load"] = {"sec": round(time.monotonic() - t0, 3)}
         
-        for scraper in scrapers:
-            if run_scraper(scraper):
-                success_count += 1
-            else:
-                logger.warning(f"Scraper {scraper} failed, continuing with others")
+        if run:
+            for line in run.summary():
+                logger.info(line)
+            run.close()
+            run = None
         
-        logger.info(f"Scraping completed: {success_count}/{len(scrapers)} scrapers successful")
+        channels = [stages[name] for name in SCRAPERS]
+        success_count = sum(stage["scraped"] for stage in channels)
+        loaded_count = sum(stage["loaded"] for stage in channels)
+        unchanged_count = sum(stage.get("unchanged", False) for stage in channels)
+        logger.info(f"Scraping completed: {success_count}/{len(SCRAPERS)} scrapers successful, "
+                    f"{loaded_count} loaded, {unchanged_count} unchanged")
         
         if success_count == 0:
             logger.error("All scrapers failed, skipping database update")
-            create_status_file("error", "All scrapers failed")
+            create_status_file("error", "All scrapers failed", stages=stages)
             return
         
-        # Load data into database
-        logger.info("Loading data into database...")
-        result = subprocess.run(
-            ['python', 'load_tv_programs_sqlite.py'], 
-            capture_output=True, 
-            text=True, 
-            timeout=300,
-            cwd='/app'
-        )
-        
-        if result.returncode == 0:
-            duration = (datetime.now() - start_time).total_seconds()
-            logger.info(f"Database update completed successfully in {duration:.1f} seconds")
+        if loaded_count:
+            if loader.schedule_export.SCHEDULE_EXPORT:
+                t0 = time.monotonic()
+                loader.export_parquet(DB_PATH)
+                stages["export"] = {"sec": round(time.monotonic() - t0, 3)}
+            
+            if "retention" not in stages:  # load_deferred() applies it in its own write
+                t0 = time.monotonic()
+                run_retention()
+                stages["retention"] = {"sec": round(time.monotonic() - t0, 3)}
             
             # Check database file
             if os.path.exists(DB_PATH):
                 db_size = os.path.getsize(DB_PATH)
                 logger.info(f"Database file size: {db_size} bytes")
-            
-            create_status_file("success", f"Job completed in {duration:.1f}s with {success_count}/{len(scrapers)} scrapers")
+        
+        duration = (datetime.now() - start_time).total_seconds()
+        if loaded_count + unchanged_count == success_count:
+            logger.info(f"Database update completed successfully in {duration:.1f} seconds")
+            create_status_file("success", f"Job completed in {duration:.1f}s with {success_count}/{len(SCRAPERS)} scrapers",
+                               stages=stages, total_sec=round(duration, 3))
         else:
-            logger.error(f"Database update failed: {result.stderr}")
-            create_status_file("error", "Database update failed")
+            create_status_file("error", f"Database update failed for {success_count - loaded_count - unchanged_count} channel(s)",
+                               stages=stages, total_sec=round(duration, 3))
             
     except Exception as e:
         logger.error(f"Fatal error in scraping job: {e}")
-        create_status_file("error", f"Fatal error: {str(e)}")
+        create_status_file("error", f"Fatal error: {str(e)}", stages=stages)
+    finally:
+        if run:
+            run.close()
     
     duration = (datetime.now() - start_time).total_seconds()
     logger.info(f"=== Scheduled scraping job completed in {duration:.1f} seconds ===")
@@ -131,6 +327,7 @@ def run_all_scrapers():
 def main():
     logger.info("TV Program Scheduler started")
     logger.info(f"Scraping interval: {SCRAPING_INTERVAL} hours")
+    logger.info(f"Scrape parallelism: {SCRAPE_PARALLELISM}, pipeline mode: {PIPELINE_MODE}")
     logger.info(f"Database path: {DB_PATH}")
     
     # Ensure data directory exists
@@ -0,0 +1,531 @@
+"""Scrape tv-program.sk weekly listings into tv_programs_<channel>.txt files.
+
+One process scrapes any number of registered channels and shares the
+detail-page cache between them:
+
+    python scraper.py                 # all channels in CHANNELS
+    python scraper.py BBC NatGeo      # a subset
+"""
+import filecmp
+import hashlib
+import os
+import requests
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+from detail_cache import DetailCache
+from load_tv_programs_sqlite import DB_PATH
+from page_parser import parse_details, parse_listing
+from tv_format import make_program
+
+# ---- Config
+SITE_URL = 'https://www.tv-program.sk'
+SEP_LINE = "-" * 40
+# Detail pages are fetched concurrently; DETAIL_RPS is a global budget shared by
+# all workers; the default 2 rps matches the old 0.5s delay between requests.
+DETAIL_WORKERS = int(os.getenv('DETAIL_WORKERS', 4))
+DETAIL_RPS = float(os.getenv('DETAIL_RPS', 2.0))
+# One pooled keep-alive session per run; retries back off on 5xx and timeouts
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 8))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 3))
+# Reuse details of programs the loader already stored instead of refetching them
+SCRAPE_INCREMENTAL = os.getenv('SCRAPE_INCREMENTAL', '1') == '1'
+# Revalidate listing pages (ETag/Last-Modified, body hash) and stop early when unchanged
+SCRAPE_CONDITIONAL = os.getenv('SCRAPE_CONDITIONAL', '1') == '1'
+
+# ---- Channel registry: short name -> listing URL + output file
+Channel = namedtuple('Channel', ['name', 'url', 'output'])
+
+CHANNELS = {
+    'BBC':    Channel('BBC', 'https://www.tv-program.sk/bbc-earth/cely-den/', 'tv_programs_BBC.txt'),
+    'Disc':   Channel('Disc', 'https://tv-program.sk/discovery-channel/cely-den', 'tv_programs_Disc.txt'),
+    'NatGeo': Channel('NatGeo', 'https://www.tv-program.sk/national-geographic/cely-den/', 'tv_programs_NatGeo.txt'),
+}
+
+OUTPUT_KEYS = [
+    'Title', 'Day', 'Date', 'Start Time', 'End Time', 'Duration',
+    'Channel', 'Link', 'Original Name', 'Year', 'Description', 'Score', 'Genre'
+]
+
+# Slovak day names -> weekday index (0=Mon)
+day_map = {
+    'Pondelok': 0, 'Utorok': 1, 'Streda': 2, 'Štvrtok': 3,
+    'Piatok': 4, 'Sobota': 5, 'Nedeľa': 6
+}
+
+
+def week_date_lookup(base_date):
+    """Build "day name" -> dd.mm.YYYY for the week starting at base_date."""
+    date_lookup = {}
+    for name, weekday_idx in day_map.items():
+        delta = weekday_idx - base_date.weekday()
+        if delta < 0:
+            delta += 7
+        date_lookup[name] = (base_date + timedelta(days=delta)).strftime('%d.%m.%Y')
+    return date_lookup
+
+
+# ------------------ scraping helpers ------------------
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+detail_limiter = RateLimiter(DETAIL_RPS)
+
+
+def make_session(pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES):
+    """Session with a keep-alive pool per host, compression and retry/backoff."""
+    retry = Retry(
+        total=retries, connect=retries, read=retries, status=retries,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # gzip/deflate, plus br/zstd when the optional decoders are installed
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    return session
+
+
+def session_stats(session):
+    """Return {'requests', 'connections', 'reused'} summed over the session's pools."""
+    n_requests = n_connections = 0
+    # one adapter may be mounted under several prefixes; count it once
+    for adapter in {id(a): a for a in session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            n_requests += pool.num_requests
+            n_connections += pool.num_connections
+    return {
+        'requests': n_requests,
+        'connections': n_connections,
+        'reused': n_requests - n_connections,
+    }
+
+
+EMPTY_DETAILS = {
+    'Original Name': '', 'Year': '', 'Description': '',
+    'Score': '', 'Genre': ''
+}
+
+
+def known_link_details(db_path=DB_PATH):
+    """Details already stored in program_info, keyed by link ({} without a DB).
+
+    Rows whose detail fields are all empty (a failed fetch) count as stale and
+    are left out, so those links get fetched again.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            rows = conn.execute("""
+                SELECT link, original_name, prod_year, description, score_pct, genre
+                FROM program_info
+                WHERE link IS NOT NULL
+            """).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"WARNING: cannot read known links from {db_path}: {e}", file=sys.stderr)
+        return {}
+
+    known = {}
+    for link, original_name, prod_year, description, score_pct, genre in rows:
+        details = {
+            'Original Name': original_name or '',
+            'Year':          str(prod_year) if prod_year is not None else '',
+            'Description':   description or '',
+            'Score':         f'{score_pct}%' if score_pct is not None else '',
+            'Genre':         genre or '',
+        }
+        if any(details.values()):
+            known[link] = details
+    return known
+
+
+def scrape_program_details(relative_url, store=None, session=None, known=None):
+    """Fetch extra info from the program page; returns empty fields on error.
+
+    With a DetailCache ``store``, fresh entries are returned without a request,
+    stale ones are revalidated with If-None-Match/If-Modified-Since, and a
+    cached copy is preferred over empty fields when the request fails or
+    answers with anything but 200/304.
+    ``session`` defaults to plain ``requests`` (a new connection per call).
+    A link in ``known`` (see known_link_details) with no cached copy is taken
+    from the DB instead of the network and stored with origin 'db', so it is
+    trusted for one TTL like a fetched page and then fetched again. Callers
+    that pass no ``known`` want page text and never see those entries.
+    """
+    if not relative_url:
+        return dict(EMPTY_DETAILS)
+    cached = store.get(relative_url) if store else None
+    if cached and cached['origin'] == 'db' and known is None:
+        cached = None  # Year/Score rebuilt from ints, not the page's own text
+    if cached and cached['fresh']:
+        store.count('hit')
+        return cached['details']
+    if known and not cached and relative_url in known:
+        if store:
+            store.put(relative_url, known[relative_url], origin='db')
+            store.count('skipped')
+        return known[relative_url]
+
+    headers = {}
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    full_url = f'{SITE_URL}{relative_url}'
+    try:
+        detail_limiter.wait()
+        resp = (session or requests).get(full_url, headers=headers, timeout=10)
+    except requests.exceptions.RequestException:
+        if store:
+            store.count('error')
+        return cached['details'] if cached else dict(EMPTY_DETAILS)
+
+    if cached and resp.status_code == 304:
+        store.touch(relative_url)
+        store.count('revalidated')
+        return cached['details']
+
+    if resp.status_code != 200:
+        # a 404 or a 5xx that outlived the retries is not a page to parse
+        if store:
+            store.count('error')
+        return cached['details'] if cached else dict(EMPTY_DETAILS)
+
+    details = parse_details(resp.content.decode('utf-8', errors='replace'))
+    if store:
+        store.put(relative_url, details,
+                  resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+        store.count('fetched')
+    return details
+
+
+def fetch_all_details(links, detail_cache, store=None, session=None, known=None):
+    """Fetch details for each link missing from detail_cache on a bounded pool.
+
+    detail_cache ({link: details}) is filled in place and returned, so it can
+    be shared by every channel scraped in the same run; ``store`` is the
+    optional persistent DetailCache consulted before the network.
+    """
+    missing = [link for link in dict.fromkeys(links) if link not in detail_cache]
+    if missing:
+        fetch = partial(scrape_program_details, store=store, session=session, known=known)
+        with ThreadPoolExecutor(max_workers=max(1, DETAIL_WORKERS)) as pool:
+            detail_cache.update(zip(missing, pool.map(fetch, missing)))
+    return detail_cache
+
+
+def parse_dt(date_str: str, time_str: str):
+    """Return datetime for 'dd.mm.YYYY' + 'HH:MM'; None on failure."""
+    if not date_str or not time_str:
+        return None
+    try:
+        return datetime.strptime(f"{date_str} {time_str}", "%d.%m.%Y %H:%M")
+    except ValueError:
+        return None
+
+
+# ------------------ scrape main page ------------------
+def fetch_listing(url, base_date, store=None, session=None, consumer='file', revalidate=True):
+    """GET a listing page; returns (html, validators), html None when unchanged.
+
+    With a DetailCache ``store`` whose ``consumer`` ('file' or 'db') took this
+    page in for the same base date (the page only names weekdays, so its
+    dates depend on it), the request is conditional and a 304, or a 200
+    whose body hashes the same as last time, means unchanged; revalidate=False
+    skips that (the consumer no longer has what it took in). validators are
+    for store.put_listing() once the listing has been handed on; None when
+    the response is not cacheable.
+    """
+    base = base_date.strftime('%Y-%m-%d')
+    use_cache = store and SCRAPE_CONDITIONAL and revalidate
+    cached = store.get_listing(url, consumer) if use_cache else None
+    if cached and cached['base_date'] != base:
+        cached = None
+    headers = {}
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    resp = (session or requests).get(url, headers=headers, timeout=30)
+    if cached and resp.status_code == 304:
+        store.count('listing_not_modified')
+        return None, None
+    body_hash = hashlib.blake2b(resp.content, digest_size=16).hexdigest()
+    if cached and resp.status_code == 200 and body_hash == cached['body_hash']:
+        store.count('listing_identical')
+        return None, None
+    if store:
+        store.count('listing_parsed')
+    validators = None
+    if resp.status_code == 200:
+        validators = {'url': url, 'consumer': consumer, 'etag': resp.headers.get('ETag'),
+                      'last_modified': resp.headers.get('Last-Modified'),
+                      'body_hash': body_hash, 'base_date': base}
+    return resp.content.decode('utf-8', errors='replace'), validators
+
+
+def listing_days(html, date_lookup):
+    """Return raw rows grouped by day: [{day_name, date_str, items:[...]}, ...]."""
+    channel_name, listing = parse_listing(html)
+
+    # Collect raw rows grouped by day so we compute durations within each day
+    days = []
+    for day_name, rows in listing:
+        date_str = date_lookup.get(day_name, '')
+        items = []
+        for start_time_str, title, link in rows:
+            start_dt = parse_dt(date_str, start_time_str)
+            items.append({
+                'Title': title,
+                'Day': day_name,
+                'Date': date_str,
+                'Start Time': start_time_str,
+                'Start DT': start_dt,
+                'Channel': channel_name,
+                'Link': link
+            })
+        days.append({'day_name': day_name, 'date_str': date_str, 'items': items})
+    return days
+
+
+# ------------------ compute durations safely ------------------
+def build_programs(days, detail_cache):
+    """Combine listing rows with durations and fetched details."""
+    final_programs = []
+    for day in days:
+        items = day['items']
+        n = len(items)
+        for i, program in enumerate(items):
+            start_dt = program['Start DT']
+            duration_min = None
+            end_dt = None
+
+            if start_dt:
+                # Next start: the next item within this day, or (if missing)
+                # we conservatively assume 50 minutes.
+                if i + 1 < n and items[i + 1]['Start DT']:
+                    next_dt = items[i + 1]['Start DT']
+                    # If page lists times past midnight as "00:xx" under the same day,
+                    # next_dt could be <= start_dt → treat it as next day.
+                    if next_dt <= start_dt:
+                        next_dt += timedelta(days=1)
+                    duration_min = int((next_dt - start_dt).total_seconds() // 60)
+                else:
+                    duration_min = 50
+
+                # Guard against weird negatives/zeros
+                if duration_min <= 0:
+                    duration_min = 50
+                end_dt = start_dt + timedelta(minutes=duration_min)
+
+            link = program['Link']
+            details = detail_cache[link]
+
+            final_programs.append({
+                'Title': program['Title'],
+                'Day': program['Day'],
+                'Date': program['Date'],
+                'Start Time': program['Start Time'] or '',
+                'End Time': end_dt.strftime('%H:%M') if end_dt else '',
+                'Duration': f'{duration_min} min' if duration_min else '',
+                'Channel': program['Channel'],
+                'Link': link or '',
+                'Original Name': details['Original Name'],
+                'Year': details['Year'],
+                'Description': details['Description'],
+                'Score': details['Score'],
+                'Genre': details['Genre']
+            })
+    return final_programs
+
+
+# ------------------ write output ------------------
+def write_programs(programs, path):
+    """Write programs to path unless it already holds exactly that; returns True if written.
+
+    The text goes to a temporary file first, so an unchanged listing keeps
+    the old file (and its mtime) and a changed one replaces it atomically.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for prog in programs:
+            for key in OUTPUT_KEYS:
+                f.write(f"{key}: {prog.get(key, '')}\n")
+            f.write(SEP_LINE + "\n")
+    if os.path.exists(path) and filecmp.cmp(tmp, path, shallow=False):
+        os.remove(tmp)
+        return False
+    os.replace(tmp, path)
+    return True
+
+
+def program_records(programs, source_file):
+    """tv_format.Program tuples for scraped programs, as the loader would read them back."""
+    for prog in programs:
+        yield make_program({key: str(prog.get(key, '')).strip() for key in OUTPUT_KEYS},
+                           source_file)
+
+
+def scrape_channel(channel, detail_cache=None, base_date=None, store=None, session=None,
+                   known=None, output=True):
+    """Scrape one registered channel; returns (programs, listing validators).
+
+    The channel's output file is written unless ``output`` is false. With a
+    ``store``, a listing page that has not changed since the last scrape
+    (see fetch_listing) returns (None, None) before any parsing or detail
+    fetching, unless the output file it was written to is gone. The validators are not saved here: the caller passes them to
+    store.put_listing() once the programs are safely handed on (written or
+    loaded), so a crash in between means the listing is parsed again.
+    ``known`` is only used without an output file: the DB holds Year and
+    Score as ints, which need not match the page text the file would show.
+    """
+    if detail_cache is None:
+        detail_cache = {}
+    base_date = base_date or datetime.today()
+    # listings written to a file and listings loaded in process are tracked apart;
+    # a missing output file (e.g. a new container, same cache) means parse again
+    consumer = 'file' if output else 'db'
+    revalidate = not output or os.path.exists(channel.output)
+    html, validators = fetch_listing(channel.url, base_date, store, session, consumer, revalidate)
+    if html is None:
+        return None, None
+    days = listing_days(html, week_date_lookup(base_date))
+    fetch_all_details(
+        (program['Link'] for day in days for program in day['items']),
+        detail_cache, store, session, None if output else known
+    )
+    programs = build_programs(days, detail_cache)
+    if output and not write_programs(programs, channel.output):
+        print(f"{channel.name}: listing unchanged, {channel.output} not rewritten")
+    return programs, validators
+
+
+class ScrapeRun:
+    """State shared by the channels scraped in one run: the in-memory detail
+    cache, the persistent DetailCache, one pooled session and the links
+    already in the DB (read on the first scrape without an output file).
+    Channels may be scraped from several threads at once.
+    """
+
+    def __init__(self):
+        self.detail_cache = {}
+        self.base_date = datetime.today()
+        self.store = DetailCache()
+        self.session = make_session()
+        self.known = None
+        self._lock = threading.Lock()
+
+    def scrape(self, name, output=True):
+        """(programs, validators) of channel ``name``; programs is None if its
+        listing is unchanged. Pass validators to save_listing() once handed on."""
+        if not output and SCRAPE_INCREMENTAL:
+            with self._lock:
+                if self.known is None:
+                    self.known = known_link_details()
+        return scrape_channel(CHANNELS[name], self.detail_cache, self.base_date,
+                              self.store, self.session, self.known, output)
+
+    def save_listing(self, validators):
+        """Remember a scraped listing so the next run can skip it if unchanged."""
+        if validators:
+            self.store.put_listing(**validators)
+
+    def summary(self):
+        """Evict expired cache entries and return the run's stats as log lines."""
+        evicted = self.store.evict()
+        st = self.store.stats
+        hs = session_stats(self.session)
+        return [
+            f"Listings: {st['listing_not_modified']} not modified (304), "
+            f"{st['listing_identical']} identical, {st['listing_parsed']} parsed",
+            f"Detail pages: {st['hit']} cached, {st['skipped']} skipped (already in DB), "
+            f"{st['revalidated']} revalidated (304), "
+            f"{st['fetched']} fetched, {st['error']} failed, {evicted} evicted",
+            f"HTTP: {hs['requests']} requests over {hs['connections']} connections "
+            f"({hs['reused']} reused)",
+        ]
+
+    def close(self):
+        self.session.close()
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def scrape_channels(names=None):
+    """Scrape several channels in one run with a shared detail cache.
+
+    Returns {name: programs}; a channel that fails is logged and left out.
+    """
+    results = {}
+    with ScrapeRun() as run:
+        for name in names or CHANNELS:
+            try:
+                results[name], validators = run.scrape(name)
+                if results[name] is None:
+                    print(f"{name}: listing not changed since the last scrape")
+                else:
+                    run.save_listing(validators)  # the output file is written
+                    print(f"{name}: {len(results[name])} programs -> {CHANNELS[name].output}")
+            except Exception as e:
+                print(f"ERROR: {name} scrape failed: {e}", file=sys.stderr)
+        for line in run.summary():
+            print(line)
+    return results
+
+
+def main(argv=None):
+    names = sys.argv[1:] if argv is None else argv
+    unknown = [n for n in names if n not in CHANNELS]
+    if unknown:
+        print(f"Unknown channel(s): {', '.join(unknown)}; known: {', '.join(CHANNELS)}",
+              file=sys.stderr)
+        return 2
+    names = names or list(CHANNELS)
+    results = scrape_channels(names)
+    return 0 if len(results) == len(names) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
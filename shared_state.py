@@ -0,0 +1,94 @@
+"""State shared by the API worker processes (gunicorn).
+
+Every worker imports the app, but the viewer simulation, the SSE hub and
+webhook delivery must run exactly once. Workers compete for an exclusive
+flock on STATE_DIR/leader.lock; the holder is the leader and runs them. It
+publishes each viewer snapshot by atomically replacing a JSON file in
+STATE_DIR (on /dev/shm when available, so nothing touches the disk). The
+other workers re-read the file when it changes, and one of them takes the
+lock over when the leader exits.
+"""
+import fcntl
+import json
+import os
+import tempfile
+
+
+def _default_dir():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, f"tvguide-api-{os.getenv('PORT', '5001')}")
+
+
+STATE_DIR = os.getenv('STATE_DIR') or _default_dir()
+STATE_POLL_SEC = float(os.getenv('STATE_POLL_SEC', 1))
+
+
+class LeaderLock:
+    """Non-blocking exclusive flock, held until the process exits."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+
+class JSONFile:
+    """A JSON document that is replaced atomically and cheap to poll."""
+
+    def __init__(self, path):
+        self.path = path
+        self._sig = None
+        self._value = None
+
+    def write(self, value):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def read(self):
+        """Return (changed since the last read, value); value is None if missing."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False, None
+        sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if sig == self._sig:
+            return False, self._value
+        with open(self.path, encoding='utf-8') as f:
+            self._value = json.load(f)
+        self._sig = sig
+        return True, self._value
+
+    def update(self, fn):
+        """Replace the value with fn(value) while holding a lock shared by all writers."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    value = json.load(f)
+            except FileNotFoundError:
+                value = None
+            value = fn(value)
+            self.write(value)
+        return value
@@ -0,0 +1,193 @@
+"""Event-driven Server-Sent Events fan-out.
+
+One asyncio loop on a daemon thread owns every subscriber connection.
+publish() serialises the payload once into an SSE frame and hands the same
+bytes to each connection's transport, so an idle stream costs no thread and
+no wake-ups per client. The payload is always a full snapshot, so a client
+whose socket buffer is full only gets the newest frame once it drains (older
+ones are coalesced away), and is dropped if it stays blocked for
+SSE_SLOW_CLIENT_SEC.
+
+    hub = SSEHub(port=5002)
+    hub.start()
+    hub.publish([{"channel": "BBC Earth", "viewers": "4185"}])
+"""
+import asyncio
+import json
+import os
+import threading
+
+SSE_HOST = os.getenv('SSE_HOST', '0.0.0.0')
+SSE_PORT = int(os.getenv('SSE_PORT', '5002'))  # 0 = no hub, /subscribe on Flask only
+SSE_PATH = b'/subscribe'
+# per-connection kernel+transport buffer before a client counts as slow
+SSE_HIGH_WATER = int(os.getenv('SSE_HIGH_WATER', 64 * 1024))
+SSE_SLOW_CLIENT_SEC = float(os.getenv('SSE_SLOW_CLIENT_SEC', 30))
+MAX_REQUEST_BYTES = 8192
+SWEEP_SEC = 1.0
+
+RESPONSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache, no-transform\r\n"
+    b"Connection: keep-alive\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"X-Accel-Buffering: no\r\n"
+    b"\r\n"
+)
+NOT_FOUND = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+PING = b": ping\n\n"
+
+
+def sse_frame(payload):
+    """Encode payload (JSON-able or an already serialised str) as one SSE event."""
+    data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return ''.join(f"data: {line}\n" for line in data.split('\n')).encode('utf-8') + b"\n"
+
+
+class _Subscriber(asyncio.Protocol):
+    """One client connection: parses the GET, then only receives frames."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.transport = None
+        self.request = b''
+        self.streaming = False
+        self.paused_since = None  # loop time the transport buffer filled up
+        self.pending = None       # newest frame held back while paused
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(high=SSE_HIGH_WATER)
+
+    def data_received(self, data):
+        if self.streaming:
+            return
+        self.request += data
+        if b'\r\n\r\n' not in self.request:
+            if len(self.request) > MAX_REQUEST_BYTES:
+                self.transport.close()
+            return
+        parts = self.request.split(b'\r\n', 1)[0].split()
+        self.request = b''
+        if len(parts) < 2 or parts[0] != b'GET' or parts[1].split(b'?')[0] != SSE_PATH:
+            self.transport.write(NOT_FOUND)
+            self.transport.close()
+            return
+        self.streaming = True
+        self.transport.write(RESPONSE_HEAD + (self.hub.frame or b''))
+        self.hub._subscribers.add(self)
+
+    def send(self, frame, now):
+        if self.paused_since is None:
+            self.transport.write(frame)
+            self.hub.stats['delivered'] += 1
+        elif now - self.paused_since > SSE_SLOW_CLIENT_SEC:
+            self.drop()
+        else:
+            if self.pending is not None:
+                self.hub.stats['coalesced'] += 1
+            self.pending = frame
+
+    def drop(self):
+        self.hub.stats['dropped'] += 1
+        self.hub._subscribers.discard(self)
+        self.transport.abort()
+
+    def pause_writing(self):
+        self.paused_since = self.hub._loop.time()
+
+    def resume_writing(self):
+        self.paused_since = None
+        if self.pending is not None:
+            frame, self.pending = self.pending, None
+            self.transport.write(frame)
+            self.hub.stats['delivered'] += 1
+
+    def connection_lost(self, exc):
+        self.hub._subscribers.discard(self)
+
+
+class SSEHub:
+    """Holds the subscribers and the last published frame."""
+
+    def __init__(self, host=SSE_HOST, port=SSE_PORT, keepalive_sec=0):
+        self.host = host
+        self.port = port
+        self.keepalive_sec = keepalive_sec
+        self.frame = None  # last published frame, sent first to new subscribers
+        self.seq = 0       # bumped on every publish()
+        self.stats = {'published': 0, 'delivered': 0, 'coalesced': 0, 'dropped': 0}
+        self._subscribers = set()
+        self._loop = None
+        self._server = None
+        self._cond = threading.Condition()
+        self._last_ping = 0.0
+
+    def start(self):
+        """Serve on a daemon thread and return the bound port."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(self._loop.create_server(
+                lambda: _Subscriber(self), self.host, self.port,
+                backlog=1024, reuse_address=True))
+            self.port = self._server.sockets[0].getsockname()[1]
+            self._last_ping = self._loop.time()
+            self._loop.call_later(SWEEP_SEC, self._sweep)
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name='sse-hub', daemon=True).start()
+        ready.wait()
+        return self.port
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, payload):
+        """Serialise payload once and fan it out; safe to call from any thread."""
+        frame = sse_frame(payload)
+        with self._cond:
+            self.frame = frame
+            self.seq += 1
+            self._cond.notify_all()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._fanout, frame)
+
+    def wait(self, seq, timeout=None):
+        """Block until a frame newer than seq exists; return (seq, frame).
+
+        For streams served by a WSGI thread instead of the hub; a reader that
+        falls behind simply gets the newest frame.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != seq, timeout)
+            return self.seq, self.frame
+
+    def _fanout(self, frame):
+        if frame is not self.frame:  # a newer publish() is already queued
+            return
+        self.stats['published'] += 1
+        now = self._loop.time()
+        for sub in list(self._subscribers):
+            sub.send(frame, now)
+
+    def _sweep(self):
+        """Drop clients blocked for too long and send keepalive pings."""
+        now = self._loop.time()
+        ping = self.keepalive_sec > 0 and now - self._last_ping >= self.keepalive_sec
+        if ping:
+            self._last_ping = now
+        for sub in list(self._subscribers):
+            if sub.paused_since is not None:
+                if now - sub.paused_since > SSE_SLOW_CLIENT_SEC:
+                    sub.drop()
+            elif ping:
+                sub.transport.write(PING)
+        self._loop.call_later(SWEEP_SEC, self._sweep)
@@ -0,0 +1,167 @@
+"""Reader for the scraper's tv_programs_*.txt format.
+
+Records are "Key: value" lines separated by a line of three or more dashes:
+
+    Title: Planet Earth
+    Date: 06.11.2025
+    Start Time: 09:10
+    ...
+    ----------------------------------------
+
+iter_programs() streams a file through mmap and yields one Program per
+record. Only the bytes of known keys are decoded, and date, time and
+number conversions are cached because the same few values repeat
+throughout a listing. The regex parser it replaced is kept as
+parse_file_regex() for reference and benchmarks.
+"""
+import mmap
+import re
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+Program = namedtuple('Program', [
+    'title', 'day_name', 'air_date', 'start_time', 'end_time', 'duration_min',
+    'channel', 'link', 'original_name', 'prod_year', 'description',
+    'score_pct', 'genre', 'source_file',
+])
+
+RECORD_SEP = re.compile(r"^-{3,}\s*$")
+KV_LINE = re.compile(r"^\s*([^:]+)\s*:\s*(.*)\s*$")
+
+
+# ------------------ cached conversions ------------------
+@lru_cache(maxsize=4096)
+def to_date_str(s):
+    """'06.11.2025' -> '2025-11-06'; None if empty or malformed."""
+    if not s:
+        return None
+    try:
+        return datetime.strptime(s, "%d.%m.%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def to_time_str(s):
+    """'09:10' -> '09:10:00'; None if empty or malformed."""
+    if not s:
+        return None
+    try:
+        return datetime.strptime(s, "%H:%M").strftime("%H:%M:%S")
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def first_int(s):
+    if not s:
+        return None
+    m = re.search(r"\d+", s)
+    return int(m.group(0)) if m else None
+
+
+def make_program(d, source_file, cached=True):
+    """Program from a {key: value} dict of one record's raw strings."""
+    date_, time_, int_ = ((to_date_str, to_time_str, first_int) if cached else
+                          (to_date_str.__wrapped__, to_time_str.__wrapped__, first_int.__wrapped__))
+    return Program(
+        title=d.get("Title") or None,
+        day_name=d.get("Day") or None,
+        air_date=date_(d.get("Date")),
+        start_time=time_(d.get("Start Time")),
+        end_time=time_(d.get("End Time")),
+        duration_min=int_(d.get("Duration")),
+        channel=d.get("Channel") or None,
+        link=d.get("Link") or None,
+        original_name=d.get("Original Name") or None,
+        prod_year=int_(d.get("Year")),
+        description=d.get("Description") or None,
+        score_pct=int_(d.get("Score")),
+        genre=d.get("Genre") or None,
+        source_file=source_file,
+    )
+
+
+# ------------------ streaming parser ------------------
+# parsed pages are handed back to the kernel every RELEASE_BYTES so a large
+# file's mapping does not accumulate in RSS
+RELEASE_BYTES = 32 * 2**20
+_CAN_RELEASE = hasattr(mmap, 'MADV_DONTNEED')
+
+KEYS = frozenset([b"Title", b"Day", b"Date", b"Start Time", b"End Time", b"Duration",
+                  b"Channel", b"Link", b"Original Name", b"Year", b"Description",
+                  b"Score", b"Genre"])
+
+
+def _is_separator(line):
+    # RECORD_SEP: starts with '---' and holds nothing but dashes and whitespace
+    return line.startswith(b"---") and not line.rstrip().strip(b"-")
+
+
+def iter_programs(path):
+    """Yield a Program for every record of path, reading it through mmap."""
+    path = Path(path)
+    source_file = path.name
+    with path.open("rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return
+        with mm:
+            fields = {}
+            in_block = False
+            released = 0
+            for line in iter(mm.readline, b""):
+                if _CAN_RELEASE and mm.tell() - released > RELEASE_BYTES:
+                    upto = mm.tell() // mmap.PAGESIZE * mmap.PAGESIZE
+                    mm.madvise(mmap.MADV_DONTNEED, released, upto - released)
+                    released = upto
+                if _is_separator(line):
+                    if in_block:
+                        yield make_program(fields, source_file)
+                        fields = {}
+                        in_block = False
+                    continue
+                colon = line.find(b":")
+                if colon < 0:
+                    # blank (also unicode whitespace, like str.strip()) or junk
+                    if line.decode("utf-8").strip():
+                        in_block = True
+                    continue
+                in_block = True
+                if colon > 0:
+                    key = line[:colon].strip()
+                    if key in KEYS:  # other keys are never decoded
+                        fields[key.decode("utf-8")] = line[colon + 1:].decode("utf-8").strip()
+            if in_block:
+                yield make_program(fields, source_file)
+
+
+# ------------------ reference parser ------------------
+def parse_file_regex(path):
+    """The original line-regex parser (kept for bench.py)."""
+    path = Path(path)
+    items = []
+    with path.open("r", encoding="utf-8") as f:
+        block = []
+        for line in f:
+            if RECORD_SEP.match(line):
+                if block:
+                    items.append(_parse_block_regex(block, path.name))
+                    block = []
+            elif line.strip():
+                block.append(line.rstrip("\n"))
+        if block:
+            items.append(_parse_block_regex(block, path.name))
+    return items
+
+
+def _parse_block_regex(lines, source_file):
+    d = {}
+    for ln in lines:
+        m = KV_LINE.match(ln)
+        if m:
+            d[m.group(1).strip()] = m.group(2).strip()
+    return make_program(d, source_file, cached=False)
@@ -0,0 +1,95 @@
+"""Vectorised viewer simulation for large channel counts.
+
+Same model as flask_now_playing.generate_viewers_snapshot(): a random
+baseline scaled by the hour and title popularity, jittered, EMA-smoothed and
+clamped to a random per-tick change. The per-channel state lives in NumPy
+arrays, so one tick is a handful of array operations instead of a Python
+loop over channels. Draws come from a numpy Generator (seeded for
+reproducible runs), so values follow the scalar distributions without being
+bit-identical to the `random` module's stream.
+"""
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency; callers fall back to the scalar loop
+    np = None
+
+
+def hour_factor_table(hour_bands):
+    """Factor for each hour 0..23 from (lo, hi, factor) bands (first match wins)."""
+    table = []
+    for h in range(24):
+        table.append(next((f for lo, hi, f in hour_bands if lo <= h < hi), 1.0))
+    return table
+
+
+class ViewerEngine:
+    """Per-channel viewer state and a vectorised tick."""
+
+    def __init__(self, channels, config, hour_bands, popularity, seed=None):
+        if np is None:
+            raise ImportError("ViewerEngine needs numpy")
+        self.channels = list(channels)
+        self.config = config
+        self.popularity = popularity
+        self.hour_factors = hour_factor_table(hour_bands)
+        self.rng = np.random.default_rng(seed)
+        n = len(self.channels)
+        self.value = np.full(n, np.nan)     # smoothed viewers, NaN = no previous tick
+        self.value_ts = np.full(n, np.nan)  # unix time of that value
+        self.pop = np.ones(n)
+        self._titles = None
+
+    def set_titles(self, titles):
+        """Refresh popularity factors from {channel: title} when it changed."""
+        if titles == self._titles:
+            return
+        self.pop = np.fromiter((self.popularity(titles.get(ch)) for ch in self.channels),
+                               dtype=float, count=len(self.channels))
+        self._titles = dict(titles)
+
+    def load_state(self, values, stamps):
+        """Seed from {channel: value} and {channel: datetime} (scalar state)."""
+        for i, ch in enumerate(self.channels):
+            if ch in values and ch in stamps:
+                self.value[i] = values[ch]
+                self.value_ts[i] = stamps[ch].timestamp()
+
+    def state(self):
+        """({channel: value}, {channel: datetime}) for channels that have one."""
+        values, stamps = {}, {}
+        for ch, v, ts in zip(self.channels, self.value.tolist(), self.value_ts.tolist()):
+            if v == v:  # not NaN
+                values[ch] = v
+                stamps[ch] = datetime.fromtimestamp(ts)
+        return values, stamps
+
+    def step(self, now: datetime):
+        """Advance every channel by one tick; returns the new values (array)."""
+        cfg, rng, n = self.config, self.rng, len(self.channels)
+        bmin, bmax = cfg["BASELINE_MIN"], cfg["BASELINE_MAX"]
+
+        baseline = rng.integers(bmin, bmax, size=n, endpoint=True)
+        raw = np.clip(baseline * (self.hour_factors[now.hour] * self.pop), bmin, bmax)
+        target = np.clip(raw * rng.uniform(0.97, 1.03, size=n), bmin, bmax)
+
+        prev = self.value
+        has_prev = ~np.isnan(prev)
+        alpha = cfg["SMOOTH_ALPHA"]
+        ema = np.where(has_prev, alpha * target + (1 - alpha) * prev, target)
+
+        # per-tick clamp scaled by the real time since the previous value
+        ts = now.timestamp()
+        dt = np.maximum(1.0, ts - self.value_ts)
+        cap = rng.integers(25, 50, size=n, endpoint=True) * (dt / cfg["VIEWERS_INTERVAL_SEC"])
+        stepped = np.where(has_prev, prev + np.clip(ema - prev, -cap, cap), ema)
+
+        self.value = np.clip(stepped, bmin, bmax)
+        self.value_ts = np.full(n, ts)
+        return self.value
+
+    def snapshot(self, now: datetime):
+        """step() formatted like generate_viewers_snapshot()."""
+        viewers = np.rint(self.step(now)).astype(np.int64).tolist()
+        return [{"channel": ch, "viewers": str(v)} for ch, v in zip(self.channels, viewers)]
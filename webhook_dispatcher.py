@@ -0,0 +1,214 @@
+"""Webhook delivery for the viewers feed.
+
+A fixed pool of worker threads POSTs to the subscribed URLs over keep-alive
+connections. Every endpoint holds at most one payload: a newer publish()
+replaces one that has not been sent yet (the payload is a full snapshot),
+and only one request per endpoint is in flight, so a slow or dead receiver
+ties up at most one worker and never delays the others. Failed deliveries
+(connection errors, timeouts, 408/429/5xx) are retried with exponential
+backoff; metrics() reports counts and latency per endpoint.
+"""
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 4))
+WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', 5))
+WEBHOOK_RETRIES = int(os.getenv('WEBHOOK_RETRIES', 3))
+WEBHOOK_BACKOFF_SEC = float(os.getenv('WEBHOOK_BACKOFF_SEC', 1))
+WEBHOOK_BACKOFF_MAX_SEC = float(os.getenv('WEBHOOK_BACKOFF_MAX_SEC', 60))
+LATENCY_SAMPLES = 200
+RETRY_STATUSES = frozenset({408, 429})  # plus every 5xx
+
+
+class _Endpoint:
+    __slots__ = ('url', 'payload', 'busy', 'attempt', 'delivered', 'failed',
+                 'retries', 'coalesced', 'last_status', 'last_error', 'latencies')
+
+    def __init__(self, url):
+        self.url = url
+        self.payload = None  # newest undelivered body
+        self.busy = False    # queued in the heap or in flight
+        self.attempt = 0
+        self.delivered = 0
+        self.failed = 0      # payloads given up on after the last retry
+        self.retries = 0
+        self.coalesced = 0   # payloads replaced by a newer one before sending
+        self.last_status = None
+        self.last_error = None
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[int(q * (len(sorted_values) - 1))]
+
+
+def redact_url(url):
+    """scheme://host/… so paths holding tokens never end up in metrics."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}" + ('/…' if parts.path.strip('/') else '')
+
+
+class WebhookDispatcher:
+    """Subscribed URLs plus the worker pool that delivers to them."""
+
+    def __init__(self, workers=WEBHOOK_WORKERS, timeout=WEBHOOK_TIMEOUT,
+                 retries=WEBHOOK_RETRIES, backoff_sec=WEBHOOK_BACKOFF_SEC,
+                 backoff_max_sec=WEBHOOK_BACKOFF_MAX_SEC):
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_sec = backoff_sec
+        self.backoff_max_sec = backoff_max_sec
+        self._endpoints = {}
+        self._heap = []  # (due monotonic time, tie-breaker, endpoint)
+        self._tie = itertools.count()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._started = False
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f'webhook-{i}', daemon=True).start()
+
+    def add(self, url):
+        with self._cond:
+            self._endpoints.setdefault(url, _Endpoint(url))
+
+    def remove(self, url):
+        with self._cond:
+            self._endpoints.pop(url, None)
+
+    def set_urls(self, urls):
+        """Subscribe exactly urls; endpoints that stay keep their queue and metrics."""
+        with self._cond:
+            for url in set(self._endpoints).difference(urls):
+                del self._endpoints[url]
+            for url in urls:
+                self._endpoints.setdefault(url, _Endpoint(url))
+
+    def urls(self):
+        with self._cond:
+            return list(self._endpoints)
+
+    def publish(self, body: bytes):
+        """Queue body for every endpoint, replacing anything not yet sent."""
+        now = time.monotonic()
+        with self._cond:
+            for ep in self._endpoints.values():
+                if ep.payload is not None:
+                    ep.coalesced += 1
+                ep.payload = body
+                if not ep.busy:
+                    ep.busy = True
+                    ep.attempt = 0
+                    self._push(ep, now)
+
+    def _push(self, ep, due):
+        heapq.heappush(self._heap, (due, next(self._tie), ep))
+        self._cond.notify()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            # one session per worker: keep-alive connections without sharing
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=1)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                _, _, ep = heapq.heappop(self._heap)
+                if self._endpoints.get(ep.url) is not ep:  # unsubscribed while queued
+                    ep.busy = False
+                    continue
+                body, ep.payload = ep.payload, None
+                ep.attempt += 1
+            ok, retryable = self._deliver(ep, body)
+            self._finish(ep, body, ok, retryable)
+
+    def _deliver(self, ep, body):
+        """POST body to ep; returns (delivered, worth retrying)."""
+        t0 = time.perf_counter()
+        try:
+            resp = self._session().post(ep.url, data=body, timeout=self.timeout,
+                                        headers={'Content-Type': 'application/json'})
+        except requests.RequestException as e:
+            with self._cond:
+                ep.last_status, ep.last_error = None, type(e).__name__
+            return False, True
+        with self._cond:
+            ep.latencies.append(time.perf_counter() - t0)
+            ep.last_status = resp.status_code
+            ep.last_error = None if resp.ok else resp.reason
+        if resp.status_code < 300:
+            return True, False
+        return False, resp.status_code >= 500 or resp.status_code in RETRY_STATUSES
+
+    def _finish(self, ep, body, ok, retryable):
+        now = time.monotonic()
+        with self._cond:
+            if self._endpoints.get(ep.url) is not ep:  # unsubscribed meanwhile
+                ep.busy = False
+                return
+            if ok:
+                ep.delivered += 1
+                ep.attempt = 0
+            elif retryable and ep.attempt <= self.retries:
+                ep.retries += 1
+                if ep.payload is None:
+                    ep.payload = body
+                delay = min(self.backoff_sec * 2 ** (ep.attempt - 1), self.backoff_max_sec)
+                self._push(ep, now + delay * random.uniform(0.5, 1.0))
+                return
+            else:
+                ep.failed += 1
+                ep.attempt = 0
+            if ep.payload is not None:
+                self._push(ep, now)
+            else:
+                ep.busy = False
+
+    def metrics(self):
+        """Per-endpoint delivery counts and latency (URLs redacted)."""
+        with self._cond:
+            out = []
+            for ep in self._endpoints.values():
+                lat = sorted(ep.latencies)
+                out.append({
+                    'endpoint': redact_url(ep.url),
+                    'delivered': ep.delivered,
+                    'failed': ep.failed,
+                    'retries': ep.retries,
+                    'coalesced': ep.coalesced,
+                    'pending': ep.payload is not None,
+                    'last_status': ep.last_status,
+                    'last_error': ep.last_error,
+                    'latency_ms': {
+                        'p50': round(_percentile(lat, 0.5) * 1000, 1),
+                        'p95': round(_percentile(lat, 0.95) * 1000, 1),
+                        'max': round(lat[-1] * 1000, 1),
+                    } if lat else None,
+                })
+            return {'workers': self.workers, 'queued': len(self._heap), 'endpoints': out}